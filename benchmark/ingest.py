@@ -0,0 +1,87 @@
+"""
+Memory benchmark of the ZINC report ingestion of a course with many sessions.
+
+The session reports are generated by suite.py and parsed once into a temporary Excel cache, so every run reads the same
+DataFrames. Each run then starts a fresh interpreter that ingests the reports, either by concatenating every report before
+resolving the duplicates ('concat', engine.zinc.concatZINCreports and resolveDuplicates) or by merging them one at a time
+('stream', engine.zinc.readZINCreports), and reports the time, the peak memory traced by tracemalloc and the memory of
+the resulting DataFrame.
+
+Usage: python benchmark/ingest.py [--students 20000] [--sessions 24] [--testcases 40] [--output ingest.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'benchmark'))
+
+from suite import TEST, generateZINCreports  # noqa: E402
+
+MODES = ['concat', 'stream']
+
+# Run in the child interpreter: ingest the reports and keep the result alive
+CHILD = '''
+import json, sys, time, tracemalloc
+sys.path.insert(0, {src!r})
+import pandas as pd
+from engine.zinc import concatZINCreports, resolveDuplicates, readZINCreports
+tracemalloc.start()
+start = time.perf_counter()
+if {mode!r} == 'concat':
+    zinc = resolveDuplicates(concatZINCreports({paths!r}))
+else:
+    zinc = readZINCreports({paths!r})
+seconds = time.perf_counter() - start
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(json.dumps({{'seconds': seconds, 'rows': zinc.shape[0], 'peakBytes': peak, 'bytes': int(zinc.memory_usage(deep=True).sum())}}))
+'''
+
+def measure(mode, paths, cache) -> dict:
+    code = CHILD.format(src=str(ROOT / 'src'), paths=[str(path) for path in paths], mode=mode)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            env={**os.environ, 'GRADEPARSER_CACHE': cache})
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure the memory of concatenated and streamed ZINC report ingestion')
+    parser.add_argument('--students', type=int, default=20000, help='Number of students of the course')
+    parser.add_argument('--sessions', type=int, default=24, help='Number of session reports')
+    parser.add_argument('--testcases', type=int, default=40, help='Number of test case columns of each report')
+    parser.add_argument('--workdir', default=str(ROOT / 'benchmark' / 'data'), help='Directory of the generated inputs')
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args(argv)
+
+    directory = Path(args.workdir) / 'ingest-{}x{}x{}'.format(args.students, args.sessions, args.testcases)
+    paths = [directory / 'Session {}.xlsx'.format(i + 1) for i in range(args.sessions)]
+    if not all(path.exists() for path in paths):
+        directory.mkdir(parents=True, exist_ok=True)
+        generateZINCreports(args.students, args.sessions, args.testcases, TEST / 'COMP2012 PA' / 'PA Report.xlsx', paths,
+                            np.random.default_rng(0), late=True)
+
+    with tempfile.TemporaryDirectory() as cache:
+        sys.path.insert(0, str(ROOT / 'src'))
+        import engine.cache
+        engine.cache.CACHE_DIR = cache
+        engine.cache.CACHE_SIZE = 1 << 40
+        engine.cache.readExcels(paths, sheet_name=0)
+        results = {mode: measure(mode, paths, cache) for mode in MODES}
+
+    print('{:<8}{:>10}{:>10}{:>14}{:>14}'.format('Mode', 'Rows', 'Seconds', 'Peak MB', 'DataFrame MB'))
+    for mode, result in results.items():
+        print('{:<8}{:>10}{:>10.2f}{:>14.1f}{:>14.1f}'.format(mode, result['rows'], result['seconds'], result['peakBytes'] / 1e6, result['bytes'] / 1e6))
+    print('Streaming uses {:.1f}x less peak memory'.format(results['concat']['peakBytes'] / results['stream']['peakBytes']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'students': args.students, 'sessions': args.sessions, 'testcases': args.testcases, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+"""
+Memory benchmark of the gradebook representation.
+
+Each run starts a fresh interpreter that loads the whole synthetic Canvas export of suite.py, either as read by
+pandas with its default types ('plain') or through engine.canvas.loadGradebook ('compact'), and reports the bytes
+used by the DataFrames and the peak memory traced by tracemalloc while loading them. Several courses can be loaded into
+the same process with --courses, as a multi-course gradebook would be.
+
+Usage: python benchmark/memory.py [--students 10000] [--assignments 500] [--courses 3] [--output memory.json]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'benchmark'))
+
+from suite import generateCourse  # noqa: E402
+
+MODES = ['plain', 'compact']
+
+# Run in the child interpreter: load the gradebooks of every course and keep them alive
+CHILD = '''
+import json, sys, tracemalloc
+sys.path.insert(0, {src!r})
+import pandas as pd
+from engine.canvas import loadGradebook, memoryUsage
+tracemalloc.start()
+gradebooks = []
+for path in {paths!r}:
+    if {mode!r} == 'plain':
+        gradebooks.append(pd.read_csv(path))
+    else:
+        gradebooks.append(loadGradebook(path)[0])
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(json.dumps({{'bytes': sum(memoryUsage(grades) for grades in gradebooks), 'peakBytes': peak}}))
+'''
+
+def measure(mode, paths) -> dict:
+    code = CHILD.format(src=str(ROOT / 'src'), paths=[str(path) for path in paths], mode=mode)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+"""
+Ratio of two measurements, 'n/a' if the second one is 0.
+"""
+def ratio(plain, compact) -> str:
+    return '{:.1f}x'.format(plain / compact) if compact else 'n/a'
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure the memory of the plain and compact gradebook')
+    parser.add_argument('--students', type=int, default=10000, help='Number of students of each course')
+    parser.add_argument('--assignments', type=int, default=500, help='Number of assignment columns in Canvas')
+    parser.add_argument('--courses', type=int, default=3, help='Number of courses loaded together')
+    parser.add_argument('--workdir', default=str(ROOT / 'benchmark' / 'data'), help='Directory of the generated inputs')
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args(argv)
+
+    paths = [generateCourse(args.students, args.assignments, Path(args.workdir))['canvas']] * args.courses
+    results = {mode: measure(mode, paths) for mode in MODES}
+    print('{:<9}{:>14}{:>14}'.format('Mode', 'DataFrame MB', 'Peak MB'))
+    for mode, result in results.items():
+        print('{:<9}{:>14.1f}{:>14.1f}'.format(mode, result['bytes'] / 1e6, result['peakBytes'] / 1e6))
+    print('Compact uses {} less memory, {} lower peak memory'.format(
+        ratio(results['plain']['bytes'], results['compact']['bytes']), ratio(results['plain']['peakBytes'], results['compact']['peakBytes'])))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'students': args.students, 'assignments': args.assignments, 'courses': args.courses, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
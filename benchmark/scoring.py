@@ -0,0 +1,94 @@
+"""
+Benchmark of the scoring steps that used to run Python for every row with DataFrame.apply(axis=1).
+The row-wise version of each step is timed next to the vectorized one, and the cost is printed per row.
+The Lab total compiled from a formula by engine.formula is timed against the hand-written vectorized one,
+which is shown in the row-wise column.
+
+Usage: python benchmark/scoring.py [rows ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from engine.lab import processLabScores
+from engine.stats import passBars
+from engine.formula import compileFormula
+
+ROWS = [10_000, 100_000]
+
+"""
+Synthetic attendance, question and ZINC sheets for n students.
+"""
+def labInputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    emails = pd.Series(['s{}@connect.ust.hk'.format(i) for i in range(n)])
+    attendance = pd.DataFrame({'Email': emails, 'Attendance': rng.integers(0, 2, n)})
+    question = pd.DataFrame({'Email': emails, 'Lucky?': np.where(rng.random(n) < 0.3, 'Yes', 'No'), 'Question score': rng.random(n).round(2)})
+    zinc = pd.DataFrame({'Email': emails, 'ZINC': rng.random(n).round(2)})
+    return attendance, question, zinc
+
+def labTotalRowwise(report):
+    return report.apply(lambda row: row['Attendance'] + row['ZINC'] + (row['Question score'] if row['Lucky?'] == 'Yes' else row['ZINC']), axis=1)
+
+def labTotalVectorized(report):
+    return report['Attendance'] + report['ZINC'] + np.where(report['Lucky?'] == 'Yes', report['Question score'], report['ZINC'])
+
+LAB_FORMULA = compileFormula("report.Attendance + report.ZINC + (report['Question score'] if report['Lucky?'] == 'Yes' else report.ZINC)")
+
+def labTotalFormula(report):
+    return LAB_FORMULA.evaluate({key: report[key[1]].to_numpy() for key in LAB_FORMULA.columns.values()}, {}, len(report))
+
+def remarksRowwise(lookup):
+    return lookup.apply(lambda row: 'No submission' if np.isnan(row['Score']) else '', axis=1)
+
+def remarksVectorized(lookup):
+    return pd.Series(np.where(lookup['Score'].isna(), 'No submission', ''), index=lookup.index)
+
+def barsRowwise(stats):
+    return stats.apply(lambda row: '[{}]'.format(''.join(['=' if i/40 < row['Pass percentage'] else ' ' for i in range(40)])), axis=1)
+
+def barsVectorized(stats):
+    return passBars(stats['Pass percentage'])
+
+"""
+Best wall time of a few runs, in seconds.
+"""
+def timeit(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(rows):
+    print('{:<24}{:>10}{:>16}{:>16}{:>10}'.format('Step', 'Rows', 'Row-wise ns/row', 'Vector ns/row', 'Speedup'))
+    for n in rows:
+        attendance, question, zinc = labInputs(n)
+        report = attendance.merge(question, on='Email').merge(zinc, on='Email')
+        rng = np.random.default_rng(1)
+        lookup = pd.DataFrame({'Score': np.where(rng.random(n) < 0.1, np.nan, rng.random(n) * 100)})
+        stats = pd.DataFrame({'Pass percentage': rng.random(n)})
+
+        steps = [
+            ('Lab Total', labTotalRowwise, labTotalVectorized, report),
+            ('PA Remarks', remarksRowwise, remarksVectorized, lookup),
+            ('PA Visualization', barsRowwise, barsVectorized, stats),
+        ]
+        for name, rowwise, vectorized, df in steps:
+            slow = timeit(rowwise, df, repeat=1)
+            fast = timeit(vectorized, df)
+            print('{:<24}{:>10}{:>16.1f}{:>16.1f}{:>9.0f}x'.format(name, n, slow / n * 1e9, fast / n * 1e9, slow / fast))
+
+        slow, fast = timeit(labTotalVectorized, report), timeit(labTotalFormula, report)
+        print('{:<24}{:>10}{:>16.1f}{:>16.1f}{:>9.1f}x'.format('Lab Total (formula)', n, slow / n * 1e9, fast / n * 1e9, slow / fast))
+
+        total = timeit(processLabScores, attendance, question, zinc, 'Lab')
+        print('{:<24}{:>10}{:>16}{:>16.1f}'.format('processLabScores', n, '-', total / n * 1e9))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or ROWS)
@@ -0,0 +1,144 @@
+"""
+Ranking benchmark of the offline code similarity on a synthetic cohort.
+
+Every student gets a C++ submission of random functions built from common statement shapes, on top of a shared
+skeleton, and some students submit only a few short functions. One student then copies another's submission with the
+identifiers renamed, some statements changed, the code reformatted and a function added. The benchmark times
+engine.similarity.rankSimilarity and fails if the planted copy is not the top pair, e.g. because small submissions
+sharing a handful of fingerprints rank above it.
+
+Usage: python benchmark/similarity.py [--students 400] [--small 40] [--seed 0] [--min-shared 20] [--output similarity.json]
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+SKELETON = '''#include <iostream>
+#include <vector>
+using namespace std;
+
+class Matrix {
+public:
+    Matrix(int rows, int cols) : rows(rows), cols(cols), data(rows * cols, 0) {}
+    int get(int r, int c) const { return data[r * cols + c]; }
+    void set(int r, int c, int v) { data[r * cols + c] = v; }
+private:
+    int rows, cols;
+    vector<int> data;
+};
+'''
+
+OPERATORS = ['+', '-', '*', '/', '%']
+COMPARISONS = ['<', '>', '<=', '>=', '==', '!=']
+
+"""
+Random statement over the variables in scope, nested up to depth.
+"""
+def statement(rng: random.Random, names: list[str], depth=0) -> str:
+    a, b, c = (rng.choice(names) for _ in range(3))
+    shape = rng.randrange(6 if depth < 2 else 3)
+    if shape == 0:
+        return '{} = {} {} {};'.format(a, b, rng.choice(OPERATORS), rng.randint(1, 9))
+    if shape == 1:
+        return '{} {}= {};'.format(a, rng.choice(OPERATORS[:3]), c)
+    if shape == 2:
+        return 'cout << {} << " " << {} << endl;'.format(a, b)
+    body = ' '.join(statement(rng, names, depth + 1) for _ in range(rng.randint(1, 3)))
+    if shape == 3:
+        return 'for (int {0} = 0; {0} < {1}; ++{0}) {{ {2} }}'.format('i' * (depth + 1), rng.randint(2, 20), body)
+    if shape == 4:
+        return 'if ({} {} {}) {{ {} }}'.format(a, rng.choice(COMPARISONS), b, body)
+    return 'while ({} {} {}) {{ {} {}--; }}'.format(a, rng.choice(COMPARISONS[:2]), rng.randint(0, 5), body, a)
+
+"""
+Random function of a submission.
+"""
+def function(rng: random.Random, name: str, statements: int) -> str:
+    names = ['x', 'y', 'z', 'total', 'count']
+    body = '\n    '.join(statement(rng, names) for _ in range(statements))
+    return 'int {}(int x, int y) {{\n    int z = 0, total = 0, count = 0;\n    {}\n    return total + z;\n}}\n'.format(name, body)
+
+"""
+Submission of one student: the skeleton and random functions, only a few short ones for the small submissions.
+"""
+def submission(rng: random.Random, small: bool) -> str:
+    functions = rng.randint(1, 2) if small else rng.randint(8, 14)
+    return SKELETON + '\n'.join(function(rng, 'f{}'.format(i), rng.randint(1, 3) if small else rng.randint(6, 14))
+                                for i in range(functions))
+
+"""
+Disguised copy of a submission: identifiers renamed, some statements changed, one statement per line and an extra function.
+"""
+def disguise(rng: random.Random, source: str) -> str:
+    for old, new in [('total', 'acc'), ('count', 'n'), ('x', 'a'), ('y', 'b'), ('z', 'tmp')]:
+        source = source.replace(old + ' ', new + ' ').replace(old + ';', new + ';').replace(old + ')', new + ')')
+    lines = source.split('\n')
+    for i in rng.sample(range(len(lines)), len(lines) // 10):
+        lines[i] = 'total = x + y;' if lines[i].strip().startswith('cout') else lines[i].replace(' = ', ' += ')
+    source = '\n'.join(lines)
+    source = source.replace('; ', ';\n        ').replace('{ ', '{\n        ')
+    return '// My own work\n' + source + '\n' + function(rng, 'helper', 5)
+
+"""
+Write the cohort to directory and return the names of the copied and the copying student.
+"""
+def generateCohort(directory: Path, students: int, small: int, rng: random.Random) -> tuple[str, str]:
+    (directory / 'skeleton.cpp').write_text(SKELETON)
+    submissions = directory / 'submissions'
+    submissions.mkdir()
+    smallStudents = set(rng.sample(range(students), small))
+    sources = {}
+    for i in range(students):
+        name = 'student{:04d}'.format(i)
+        sources[name] = submission(rng, i in smallStudents)
+    original, copier = rng.sample([name for i, name in enumerate(sources) if i not in smallStudents], 2)
+    sources[copier] = disguise(rng, sources[original])
+    for name, source in sources.items():
+        (submissions / (name + '.cpp')).write_text(source)
+    return original, copier
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Check that a planted copy is the top pair of the similarity ranking')
+    parser.add_argument('--students', type=int, default=400, help='Number of submissions')
+    parser.add_argument('--small', type=int, default=40, help='Number of submissions with only a few short functions')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated cohort')
+    parser.add_argument('--min-shared', type=int, help='Fewest shared fingerprints of a reported pair, defaults to MIN_SHARED')
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args(argv)
+
+    import engine.cache
+    from engine.similarity import rankSimilarity, MIN_SHARED
+    minShared = MIN_SHARED if args.min_shared is None else args.min_shared
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        # Fingerprint every submission instead of reading the cache of an earlier run
+        engine.cache.CACHE_DIR = ''
+        original, copier = generateCohort(directory, args.students, args.small, random.Random(args.seed))
+        start = time.perf_counter()
+        ranked = rankSimilarity(directory / 'submissions', directory / 'skeleton.cpp', minShared=minShared)
+        seconds = time.perf_counter() - start
+
+    planted = ranked.index[ranked['Student A'].isin([original, copier]) & ranked['Student B'].isin([original, copier])]
+    rank = int(planted[0]) + 1 if len(planted) else None
+    print(ranked.head(5).to_string())
+    print('{} pairs ranked in {:.2f}s, the planted copy ({} and {}) is at rank {}'.format(ranked.shape[0], seconds, original, copier, rank))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'students': args.students, 'small': args.small, 'seed': args.seed, 'minShared': minShared, 'pairs': ranked.shape[0],
+                       'seconds': seconds, 'plantedRank': rank}, f, indent=2)
+    if rank != 1:
+        print('The planted copy is not the most similar pair', file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,100 @@
+"""
+Startup-time benchmark guarding the time to the first window.
+
+Each run starts a fresh interpreter that imports main.py and selectionApp, shows the selection window if a display is
+available, and reports which heavy libraries were loaded on the way. The apps of each type are then constructed
+the same way, since they are shown right after the selection. pandas, numpy, openpyxl and matplotlib should only be
+imported once a file is chosen, so the benchmark fails if any of them is loaded before the window appears,
+or if the fastest run takes longer than --max-seconds.
+
+Usage: python benchmark/startup.py [--repeat 5] [--max-seconds 1.5] [--output startup.json]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / 'src'
+
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'matplotlib', 'pyarrow']
+TARGETS = {
+    'selection': ('selectionApp', 'selectionApp'),
+    'lab': ('labApp', 'LabApp'),
+    'pa': ('paApp', 'PaApp'),
+    'hw': ('hwApp', 'HwApp'),
+}
+
+# Run in the child interpreter: import the module of the window, build it and draw it once
+CHILD = '''
+import json, sys, time
+import tkinter as tk
+start = time.perf_counter()
+import main
+from {module} import {name}
+imported = time.perf_counter()
+try:
+    root = tk.Tk()
+except tk.TclError:
+    root = None
+if root is not None:
+    app = {name}(root)
+    root.update()
+shown = time.perf_counter()
+heavy = [module for module in {heavy!r} if module in sys.modules]
+if root is not None:
+    root.destroy()
+print(json.dumps({{'import': imported - start, 'window': shown - start, 'display': root is not None, 'heavy': heavy}}))
+'''
+
+"""
+Start one interpreter for the target and return its timings, with the wall time including the interpreter startup.
+"""
+def runOnce(target) -> dict:
+    module, name = TARGETS[target]
+    begin = time.perf_counter()
+    child = subprocess.run([sys.executable, '-c', CHILD.format(module=module, name=name, heavy=HEAVY_MODULES)],
+                           cwd=SRC, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - begin
+    return {'wall': wall, **json.loads(child.stdout.strip().splitlines()[-1])}
+
+"""
+Fastest of several runs of each target.
+"""
+def runStartup(targets, repeat) -> list[dict]:
+    results = []
+    for target in targets:
+        runs = [runOnce(target) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['wall'])
+        results.append({'target': target, **best})
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the time to the first window')
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS), help='Windows to measure')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each target, the fastest one is kept')
+    parser.add_argument('--max-seconds', type=float, default=1.5, help='Fail if the first window takes longer, including the interpreter startup')
+    parser.add_argument('--output', help='JSON file of the results')
+    args = parser.parse_args(argv)
+
+    results = runStartup(args.targets, args.repeat)
+    failed = False
+    print('{:<10}{:>10}{:>10}{:>12}  {}'.format('Window', 'Wall', 'Import', 'Shown', 'Heavy modules'))
+    for r in results:
+        print('{:<10}{:>10.3f}{:>10.3f}{:>12}  {}'.format(r['target'], r['wall'], r['import'],
+                                                         '{:.3f}'.format(r['window']) if r['display'] else 'no display',
+                                                         ', '.join(r['heavy']) or '-'))
+        if r['heavy'] or r['wall'] > args.max_seconds:
+            failed = True
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'maxSeconds': args.max_seconds, 'results': results}, f, indent=2)
+    if failed:
+        print('Startup is slower than {}s or loads heavy modules before a file is chosen'.format(args.max_seconds), file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
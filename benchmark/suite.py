@@ -0,0 +1,302 @@
+"""
+Benchmark suite of the Lab, PA and HW flows on synthetic courses.
+
+The inputs are generated from the layouts of the test fixtures: the Canvas export of 'Sample Canvas.csv',
+the ZINC reports 'Lab Report LA*.xlsx' and 'PA Report.xlsx', the attendance and question sheets of the lab templates,
+and 'HW_grading.xlsx'. Every stage of each flow is timed: load, dedupe, score, merge, export and stats.
+The results are saved as JSON, and a previous result can be given to compare against.
+
+Usage: python benchmark/suite.py [--students 100 1000 10000 50000] [--assignments 500] [--output results.json] [--compare old.json]
+
+The Excel cache is disabled unless --cache is given, so the load stage measures the parsing.
+Generated inputs are kept in --workdir and reused by later runs with the same sizes.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST = ROOT / 'test'
+sys.path.insert(0, str(ROOT / 'src'))
+
+STUDENTS = [100, 1000, 10000, 50000]
+ASSIGNMENTS = 500
+LAB_SESSIONS = 3
+PA_TESTCASES = 10
+FLOWS = ['lab', 'pa', 'hw']
+STAGES = ['load', 'dedupe', 'score', 'merge', 'export', 'stats']
+TARGET = 'Benchmark (999999)'
+
+"""
+Synthetic Canvas export with the identity and total columns of 'Sample Canvas.csv', and the given number of
+assignment columns. The last assignment, TARGET, is blank for every student so it is the candidate for import.
+"""
+def generateCanvas(students, assignments, path, rng):
+    template = pd.read_csv(TEST / 'Sample Canvas.csv', dtype=str, keep_default_na=False)
+    identity = ['Student', 'ID', 'SIS User ID', 'SIS Login ID', 'Section']
+    totals = [column for column in template.columns if column not in identity and not column.endswith(')')]
+    labels = ['Assignment {} ({})'.format(i, 400000 + i) for i in range(assignments - 1)] + [TARGET]
+
+    ids = np.arange(students)
+    canvas = pd.DataFrame({
+        'Student': ['STUDENT, {}'.format(i) for i in ids],
+        'ID': (100000 + ids).astype(str),
+        'SIS User ID': (20000000 + ids).astype(str),
+        'SIS Login ID': ['s{}@connect.ust.hk'.format(i) for i in ids],
+        'Section': ['L{}'.format(i % LAB_SESSIONS + 1) for i in ids],
+    })
+    scores = pd.DataFrame(rng.integers(0, 101, (students, assignments - 1)).astype(str), columns=labels[:-1])
+    scores[TARGET] = ''
+    extra = pd.DataFrame({column: template[column].iloc[2] for column in totals}, index=canvas.index)
+    canvas = pd.concat([canvas, scores, extra], axis=1)
+
+    header = pd.DataFrame([
+        {**{column: '' for column in canvas.columns}, **{label: 'Manual Posting' for label in labels}},
+        {**{column: '(read only)' for column in canvas.columns}, **{'Student': '    Points Possible'}, **{label: '100' for label in labels}, **{column: '' for column in identity[1:]}},
+    ])
+    testStudent = template.iloc[[-1]].reindex(columns=canvas.columns, fill_value='')
+    pd.concat([header, canvas, testStudent], ignore_index=True).to_csv(path, index=False)
+
+"""
+Synthetic ZINC reports with the columns of a template report, one report per session.
+A TA submits to every session and a small share of students submit to a second session.
+"""
+def generateZINCreports(students, sessions, testcases, template, paths, rng, late=False):
+    columns = list(pd.read_excel(template, nrows=0).columns[:4])
+    ids = np.arange(students)
+    session = ids % sessions
+    swapped = rng.random(students) < 0.02
+    for i, path in enumerate(paths):
+        members = ids[(session == i) | (swapped & ((session + 1) % sessions == i))]
+        passed = rng.random((members.shape[0], testcases)) < 0.7
+        report = pd.DataFrame({
+            columns[0]: ['ta'] + ['s{}'.format(m) for m in members],
+            columns[1]: ['TA, Test Submission'] + ['STUDENT, {}'.format(m) for m in members],
+            columns[2]: np.concatenate([[100.0], passed.mean(axis=1).round(4) * 100]),
+            columns[3]: [np.nan] + [('{:.2f} mins'.format(m) if late and m < 60 else np.nan) for m in rng.integers(0, 2000, members.shape[0])],
+        })
+        for t in range(testcases):
+            report['Standard I/O - Test Case {}'.format(t + 1)] = np.concatenate([[1], passed[:, t].astype(int)])
+        report.to_excel(path, index=False)
+
+"""
+Synthetic attendance sheet with a Tally sheet, and question score workbook with one sheet per session.
+"""
+def generateLabSheets(students, sessions, attendance_xlsx, question_xlsx, rng):
+    ids = np.arange(students)
+    tally = pd.DataFrame({
+        'Name': ['STUDENT, {}'.format(i) for i in ids],
+        'SID': 20000000 + ids,
+        'Email': ['s{}@connect.ust.hk'.format(i) for i in ids],
+        'Section': ['L{}'.format(i % sessions + 1) for i in ids],
+        'Attendance': (rng.random(students) < 0.9).astype(int),
+    })
+    with pd.ExcelWriter(attendance_xlsx) as writer:
+        tally.to_excel(writer, sheet_name='Tally', index=False)
+
+    with pd.ExcelWriter(question_xlsx) as writer:
+        for i in range(sessions):
+            members = tally.loc[ids % sessions == i]
+            lucky = rng.random(members.shape[0]) < 0.5
+            pd.DataFrame({
+                'Name': members['Name'], 'Email': members['Email'], 'Group': 'A',
+                'Lucky?': np.where(lucky, 'Yes', 'No'),
+                'Attendance score': np.nan,
+                'Question score': np.where(lucky, rng.integers(0, 3, members.shape[0]) / 2, np.nan),
+            }).to_excel(writer, sheet_name='LA{}'.format(i + 1), index=False)
+
+"""
+Synthetic homework gradefile with the columns of 'HW_grading.xlsx'.
+"""
+def generateHWreport(students, path, rng):
+    columns = list(pd.read_excel(TEST / 'COMP2611 HW' / 'HW_grading.xlsx', nrows=0).columns)
+    questions = [column for column in columns[5:] if column not in ['Total', 'Remarks']]
+    ids = np.arange(students)
+    marks = rng.integers(0, 5, (students, len(questions)))
+    report = pd.DataFrame({
+        'Student': ['STUDENT, {}'.format(i) for i in ids],
+        'ID': 100000 + ids,
+        'SIS User ID': 20000000 + ids,
+        'SIS Login ID': ['s{}@connect.ust.hk'.format(i) for i in ids],
+        'Section': ['L{}'.format(i % LAB_SESSIONS + 1) for i in ids],
+    })
+    report = pd.concat([report, pd.DataFrame(marks, columns=questions)], axis=1)
+    report['Total'] = marks.sum(axis=1)
+    report['Remarks'] = np.nan
+    report.to_excel(path, index=False)
+
+"""
+Generate all inputs for one size into a directory, unless they already exist.
+"""
+def generateCourse(students, assignments, workdir: Path, seed=0) -> dict:
+    directory = workdir / '{}x{}'.format(students, assignments)
+    course = {
+        'canvas': directory / 'Canvas.csv',
+        'labZinc': [directory / 'Lab Report LA{}.xlsx'.format(i + 1) for i in range(LAB_SESSIONS)],
+        'attendance': directory / 'Attendance.xlsx',
+        'question': directory / 'Question scores.xlsx',
+        'paZinc': [directory / 'PA Report.xlsx', directory / 'PA Report - Late Submissions.xlsx'],
+        'hw': directory / 'HW_grading.xlsx',
+    }
+    if (directory / '.complete').exists():
+        return course
+
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    generateCanvas(students, assignments, course['canvas'], rng)
+    generateZINCreports(students, LAB_SESSIONS, 3, TEST / 'COMP2012 Lab' / 'Lab Report LA1.xlsx', course['labZinc'], rng)
+    generateLabSheets(students, LAB_SESSIONS, course['attendance'], course['question'], rng)
+    generateZINCreports(students, 2, PA_TESTCASES, TEST / 'COMP2012 PA' / 'PA Report.xlsx', course['paZinc'], rng, late=True)
+    generateHWreport(students, course['hw'], rng)
+    (directory / '.complete').touch()
+    return course
+
+"""
+Times the stages of one flow, recording wall time and peak Python memory of each stage.
+"""
+class Timer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, stage, func, *args, **kwargs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        previous = self.stages.get(stage, {'seconds': 0.0, 'peakBytes': 0})
+        self.stages[stage] = {'seconds': previous['seconds'] + seconds, 'peakBytes': max(previous['peakBytes'], peak)}
+        return result
+
+def runLab(course, output_csv, timer: Timer):
+    from engine.canvas import scanGradebook, loadGradebook, fillScores, writeGradebook
+    from engine.lab import parseLabAttendance, parseLabQuestions, processLabScores
+    from engine.zinc import concatZINCreports, resolveDuplicates
+
+    timer.run('load', scanGradebook, course['canvas'])
+    grades, _ = timer.run('load', loadGradebook, course['canvas'], [TARGET])
+    attendance = timer.run('load', parseLabAttendance, [course['attendance']])
+    zinc = timer.run('load', concatZINCreports, course['labZinc'])
+    question = timer.run('load', parseLabQuestions, course['question'], LAB_SESSIONS)
+    zinc = timer.run('dedupe', resolveDuplicates, zinc)
+
+    def score():
+        zinc['Email'] = zinc['ITSC'] + '@connect.ust.hk'
+        zinc['ZINC'] = zinc['Score'].div(100)
+        return processLabScores(attendance, question, zinc, TARGET)
+    report = timer.run('score', score)
+    timer.run('merge', fillScores, grades, report, TARGET)
+    timer.run('export', writeGradebook, grades, output_csv, course['canvas'])
+
+def runPA(course, output_csv, timer: Timer):
+    from engine.canvas import scanGradebook, loadGradebook, fillScores, writeGradebook
+    from engine.pa import scorePAreport
+    from engine.stats import scoreStats, scoreHistogram, testcaseStats
+    from engine.zinc import concatZINCreports, resolveDuplicates
+
+    timer.run('load', scanGradebook, course['canvas'])
+    grades, _ = timer.run('load', loadGradebook, course['canvas'], [TARGET])
+    zinc = timer.run('load', concatZINCreports, course['paZinc'])
+    zinc = timer.run('dedupe', resolveDuplicates, zinc).drop(columns=['File'])
+    report = timer.run('score', scorePAreport, zinc, TARGET)
+    scores = timer.run('merge', fillScores, grades, report, TARGET)
+    timer.run('export', writeGradebook, grades, output_csv, course['canvas'])
+    timer.run('stats', lambda: (scoreStats(scores[TARGET]), scoreHistogram(grades[TARGET]), testcaseStats(zinc)))
+
+def runHW(course, output_csv, timer: Timer):
+    from engine.canvas import scanGradebook, loadGradebook, fillScores, writeGradebook
+    from engine.hw import parseHWreport
+
+    timer.run('load', scanGradebook, course['canvas'])
+    grades, _ = timer.run('load', loadGradebook, course['canvas'], [TARGET])
+    report = timer.run('load', parseHWreport, course['hw'], TARGET)
+    timer.run('merge', fillScores, grades, report, TARGET)
+    timer.run('export', writeGradebook, grades, output_csv, course['canvas'])
+
+RUNNERS = {'lab': runLab, 'pa': runPA, 'hw': runHW}
+
+"""
+Commit of the working tree, to label the results.
+"""
+def version() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def runSuite(students, assignments, flows, workdir: Path, repeat=1) -> dict:
+    results = []
+    for n in students:
+        print('Generating {} students x {} assignments...'.format(n, assignments), file=sys.stderr)
+        course = generateCourse(n, assignments, workdir)
+        for flow in flows:
+            best = None
+            for _ in range(repeat):
+                timer = Timer()
+                RUNNERS[flow](course, workdir / 'output.csv', timer)
+                if best is None or sum(s['seconds'] for s in timer.stages.values()) < sum(s['seconds'] for s in best.values()):
+                    best = timer.stages
+            for stage in STAGES:
+                if stage in best:
+                    results.append({'flow': flow, 'students': n, 'assignments': assignments, 'stage': stage, **best[stage]})
+    return {
+        'version': version(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def printResults(suite: dict, baseline: dict = None):
+    previous = {}
+    if baseline is not None:
+        previous = {(r['flow'], r['students'], r['assignments'], r['stage']): r['seconds'] for r in baseline['results']}
+        print('Compared with {} ({})'.format(baseline['version'], baseline['date']))
+    print('{:<6}{:>9}{:>8}{:>12}{:>12}{:>10}'.format('Flow', 'Students', 'Stage', 'Seconds', 'Peak MB', 'Change'))
+    for r in suite['results']:
+        old = previous.get((r['flow'], r['students'], r['assignments'], r['stage']))
+        change = '{:+.0%}'.format(r['seconds'] / old - 1) if old else ''
+        print('{:<6}{:>9}{:>8}{:>12.4f}{:>12.1f}{:>10}'.format(r['flow'], r['students'], r['stage'], r['seconds'], r['peakBytes'] / 1e6, change))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the grade parsing flows on synthetic courses')
+    parser.add_argument('--students', type=int, nargs='+', default=STUDENTS, help='Number of students of each course')
+    parser.add_argument('--assignments', type=int, default=ASSIGNMENTS, help='Number of assignment columns in Canvas')
+    parser.add_argument('--flows', nargs='+', choices=FLOWS, default=FLOWS, help='Flows to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each flow, the fastest one is kept')
+    parser.add_argument('--workdir', default=str(ROOT / 'benchmark' / 'data'), help='Directory of the generated inputs')
+    parser.add_argument('--output', help='JSON file of the results, defaults to benchmark/results/<version>.json')
+    parser.add_argument('--compare', help='JSON file of previous results to compare with')
+    parser.add_argument('--cache', action='store_true', help='Keep the Excel cache enabled')
+    args = parser.parse_args(argv)
+
+    if not args.cache:
+        os.environ['GRADEPARSER_CACHE'] = ''
+
+    suite = runSuite(args.students, args.assignments, args.flows, Path(args.workdir), args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    printResults(suite, baseline)
+
+    output = Path(args.output) if args.output else ROOT / 'benchmark' / 'results' / '{}.json'.format(suite['version'])
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(suite, f, indent=2)
+    print('Results written to "{}"'.format(output), file=sys.stderr)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,13 +1,49 @@
+from __future__ import annotations
+
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog, messagebox
 
 from pathlib import Path
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+import queue
+import threading
+import traceback
+
+from utility import Table, TracePanel, askduplicates, askcombobox
+from engine.policy import POLICIES, POLICY_FILE, DEFAULT_POLICY
+from engine import trace
+from engine.trace import stage
+
+# pandas and the engine modules using it are imported by the background tasks once a file is chosen,
+# so the window appears without waiting for them
+if TYPE_CHECKING:
+    import pandas as pd
 
-from utility import Table
+# Interval in milliseconds at which the UI checks the queue of a running background task
+POLL_INTERVAL = 50
+
+# Choices of the export dialog, by mode of engine.canvas.EXPORT_MODES (not imported, as engine.canvas loads pandas)
+EXPORT_LABELS = {
+    'full': 'Full gradebook',
+    'column': 'Assignment column only',
+    'changed': 'Changed scores only',
+}
+
+class TaskCancelled(Exception):
+    """
+    Raised in a background task when the user cancels it.
+    """
 
 class AsgnApp(tk.Frame):
+    # Kind of the app in the session store, see engine.session
+    sessionKind: str = None
+
+    # DataFrames and flags saved in the session of an assignment, extended by derived classes
+    sessionFrames: list[str] = ['grades', 'canvasScores', 'report', 'scores', 'exported']
+    sessionFlags: list[str] = []
+
     def __init__(self, master = None):
         super().__init__(master)
 
@@ -23,17 +59,59 @@ class AsgnApp(tk.Frame):
         # Calculated score DataFrame
         self.report: pd.DataFrame = None
 
+        # Scores of the gradebook rows, indexed by 'SIS Login ID'
+        self.scores: pd.DataFrame = None
+
+        # Assignment column as loaded from Canvas, before any score was filled in
+        self.canvasScores: pd.Series = None
+
         # List of additional columns to display on the table
         self.extraColumns: list[str] = []
 
+        # Policy to resolve duplicate ITSCs in ZINC reports, can be changed in the review dialog
+        self.duplicatePolicy: str = DEFAULT_POLICY
+
         # Checks whether Canvas has Manual Posting enabled
         self.hasManualPostingRow: bool = True
 
+        # Hash of the Canvas CSV the gradebook was loaded from, to know whether a saved session still matches it
+        self.canvasHash: str = None
+
+        # Export mode last chosen, and the text of each student's score in the last export by 'SIS Login ID'
+        self.exportMode: str = 'full'
+        self.exported: pd.Series = None
+
         # To be initialized by derived classes
         self.canvasCSVLabel: ttk.Label = None
         self.assignmentSelectionCombobox: ttk.Combobox = None
         self.gradeTable: Table = None
 
+        # Summary of the recorded stages, only available when tracing is enabled
+        self.tracePanel: TracePanel = None
+        if trace.enabled():
+            self.traceButton = ttk.Button(self, text='Timings', command=self.traceButtonPressed)
+            self.traceButton.grid(row=5, column=3, padx=10, pady=10)
+
+        # Background task: parsing and computation run on one worker thread,
+        # and progress, results and dialogs are sent back to the UI through a queue polled with after()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.task = None
+        self.taskTitle: str = None
+
+        # Sessions are pickled on their own worker thread, in the order they are saved, so saving never blocks the UI
+        # nor waits for the running task
+        self.sessionExecutor = ThreadPoolExecutor(max_workers=1)
+
+        self.progressBar = ttk.Progressbar(self, orient='horizontal')
+        self.progressBar.grid(row=6, column=0, columnspan=3, padx=10, pady=10, sticky='ew')
+        self.progressBar.grid_remove()
+
+        self.cancelButton = ttk.Button(self, text='Cancel', command=self.cancelButtonPressed)
+        self.cancelButton.grid(row=6, column=3, padx=10, pady=10)
+        self.cancelButton.grid_remove()
+
 
     @property
     def tableColumns(self) -> list:
@@ -41,9 +119,12 @@ class AsgnApp(tk.Frame):
 
     @property
     def assignmentName(self) -> str:
-        if not self.assignmentLabel: 
-            return None
-        return self.assignmentLabel.split(' (')[0]
+        from engine.canvas import assignmentName
+        return assignmentName(self.assignmentLabel)
+
+    @property
+    def displayedColumns(self) -> list:
+        return self.tableColumns + (self.extraColumns if self.report is not None else [])
 
     @property
     def table(self) -> pd.DataFrame:
@@ -56,37 +137,339 @@ class AsgnApp(tk.Frame):
     
     """
     Import Canvas CSV event handler
+    Only the header and the blanks of each column are scanned here, the gradebook is loaded once an assignment is selected.
     """
     def canvasCSVButtonPressed(self):
         grade_csv = filedialog.askopenfilename(filetypes=[('CSV files', '.csv')], title='Select the Canvas Grade Export .csv file:')
         if not grade_csv:
             return
-        self.grade_csv = grade_csv
-        self.canvasCSVLabel.config(text='Select the Canvas CSV file:\n{}'.format(Path(self.grade_csv).name))
 
-        self.grades = pd.read_csv(self.grade_csv)
-        self.grades = self.grades.astype({'ID': 'Int64', 'SIS User ID': 'Int64'})
+        def task(progress):
+            from engine.canvas import scanGradebook
+            with stage('Scan Canvas CSV'):
+                return scanGradebook(grade_csv, progress=progress)
+
+        def done(result):
+            candidates, self.hasManualPostingRow = result
+            self.grade_csv = grade_csv
+            self.canvasCSVLabel.config(text='Select the Canvas CSV file:\n{}'.format(Path(self.grade_csv).name))
+            if not self.hasManualPostingRow:
+                messagebox.showwarning(title='Warning', message='Grade Posting Policy detected as Automatic. Consider changing it on Canvas.')
+            self.assignmentSelectionCombobox.config(values=candidates, state='normal')
+
+        self.runTask('Scan Canvas CSV', task, done)
+
+    """
+    Load the identity columns and the selected assignment column of the Canvas CSV in the background, then call then().
+    If a session of the assignment was saved, the user can restore it instead of importing the gradesheets again.
+    The saved gradebook is used as is if the Canvas CSV did not change, otherwise the saved scores are merged into the new one.
+    Since the Canvas column is restored too, importing a gradesheet again after a restore replaces the restored scores.
+    """
+    def loadAssignment(self, then=None):
+        grade_csv = self.grade_csv
+        assignmentLabel = self.assignmentSelectionCombobox.get()
+
+        def task(progress):
+            from engine.canvas import loadGradebook, memoryUsage
+            from engine.cache import fileHash
+            from engine.session import sessionManifest, loadSession
+            canvasHash = fileHash(grade_csv)
+            manifest = sessionManifest(self.sessionKind, assignmentLabel)
+            state, frames = None, {}
+            if manifest is not None and self.callInMainThread(messagebox.askyesno, 'Restore session',
+                    'A session of "{}" was saved on {}. Restore its imported gradesheets and scores?'.format(assignmentLabel, manifest['saved'].replace('T', ' '))):
+                with stage('Restore session') as s:
+                    stale = manifest['state'].get('canvasHash') != canvasHash
+                    names = [name for name in self.sessionFrames if not (stale and name in ['grades', 'canvasScores', 'scores'])]
+                    state, frames = loadSession(self.sessionKind, assignmentLabel, names)
+                    s.rows = len(frames)
+            # The saved gradebook is only used with the column loaded from Canvas, which a re-import merges into again
+            if 'grades' in frames and 'canvasScores' in frames:
+                return canvasHash, (frames['grades'], state['hasManualPostingRow']), state, frames
+            with stage('Load Canvas CSV') as s:
+                result = loadGradebook(grade_csv, [assignmentLabel])
+                s.rows = result[0].shape[0]
+                s.size = memoryUsage(result[0])
+            for name in ['grades', 'canvasScores', 'scores']:
+                frames.pop(name, None)
+            return canvasHash, result, state, frames
+
+        def done(result):
+            self.canvasHash, (self.grades, self.hasManualPostingRow), state, frames = result
+            self.assignmentLabel = assignmentLabel
+            self.canvasScores = self.grades[assignmentLabel].copy()
+            if state is not None:
+                self.restoreSession(state, frames)
+            if then is not None:
+                then()
+            if self.report is not None:
+                self.sessionRestored()
+
+        if not self.runTask('Load Canvas CSV', task, done):
+            self.assignmentSelectionCombobox.set(self.assignmentLabel or '')
+
+    """
+    Set the state and DataFrames of a restored session.
+    If the gradebook was loaded again because the Canvas CSV changed, the saved report is merged into it.
+    """
+    def restoreSession(self, state: dict, frames: dict):
+        for name in self.sessionFrames:
+            if name in frames or name not in ['grades', 'canvasScores']:
+                setattr(self, name, frames.get(name))
+        for name in self.sessionFlags:
+            setattr(self, name, state['flags'].get(name, False))
+        self.duplicatePolicy = state.get('duplicatePolicy', DEFAULT_POLICY)
+        self.exportMode = state.get('exportMode', self.exportMode)
+        if self.report is not None and 'scores' not in frames:
+            self.mergeScores()
+
+    """
+    Called once a session with calculated scores is restored, to enable the buttons using them.
+    """
+    def sessionRestored(self):
+        self.generateButton.config(state='normal')
+
+    """
+    Save the gradebook, the parsed gradesheets and the scores as the session of the assignment, see engine.session.
+    The DataFrames are copied here, as the next import may modify them, and pickled on the session worker thread.
+    Failing to save is reported without interrupting the work on the scores.
+    """
+    def saveSession(self):
+        from engine.session import saveSession
+        state = {'canvas': str(self.grade_csv), 'canvasHash': self.canvasHash, 'hasManualPostingRow': self.hasManualPostingRow,
+                 'duplicatePolicy': self.duplicatePolicy, 'exportMode': self.exportMode, 'flags': {name: getattr(self, name) for name in self.sessionFlags}}
+        frames = {name: None if getattr(self, name) is None else getattr(self, name).copy() for name in self.sessionFrames}
+        kind, assignmentLabel, rows = self.sessionKind, self.assignmentLabel, self.grades.shape[0]
+
+        def save():
+            with stage('Save session') as s:
+                saveSession(kind, assignmentLabel, state, frames)
+                s.rows = rows
+
+        self.after(POLL_INTERVAL, self.pollSession, self.sessionExecutor.submit(save))
+
+    """
+    Wait on the UI thread for a session save to finish, to report its failure
+    """
+    def pollSession(self, future):
+        if not future.done():
+            self.after(POLL_INTERVAL, self.pollSession, future)
+            return
+        error = future.exception()
+        if isinstance(error, (OSError, ValueError)):
+            traceback.print_exception(type(error), error, error.__traceback__)
+            messagebox.showwarning(title='Session not saved', message='The session could not be saved:\n{}'.format(error))
+        elif error is not None:
+            raise error
 
-        self.hasManualPostingRow = (self.grades['Student'][0] != '    Points Possible')
-        if not self.hasManualPostingRow:
-            messagebox.showwarning(title='Warning', message='Grade Posting Policy detected as Automatic. Consider changing it on Canvas.')
+    """
+    Merge self.report into the assignment column of self.grades by 'SIS Login ID', with absent students receiving 0.
+    The column is reset to self.canvasScores first, so merging again after a re-import replaces the scores of the earlier merge.
+    Warns about scores of students who are not in the Canvas gradebook, since they would be lost.
+    """
+    def mergeScores(self, dtype=None):
+        from engine.canvas import fillScores, unmatchedStudents
+        with stage('Merge scores') as s:
+            unmatched, extra = unmatchedStudents(self.grades, self.report)
+            self.grades[self.assignmentLabel] = self.canvasScores.copy()
+            self.scores = fillScores(self.grades, self.report, self.assignmentLabel, dtype)
+            s.rows = self.report.shape[0]
+        self.saveSession()
+        if extra:
+            messagebox.showwarning(title='Unmatched students',
+                                   message='{} student(s) in the gradesheet are not in Canvas and were skipped:\n{}\n\n{} student(s) in Canvas received 0.'
+                                   .format(len(extra), '\n'.join(extra[:20]) + ('\n...' if len(extra) > 20 else ''), len(unmatched)))
 
-        gradesNanCount = self.grades.drop(index=0).isna().sum()
-        possibleAssignments = gradesNanCount.loc[gradesNanCount == gradesNanCount.max()].index
-        self.assignmentSelectionCombobox.config(values=list(possibleAssignments), state='normal')
+    """
+    Rewrite the scores of the given students from self.report after a re-import, see engine.canvas.patchScores.
+    """
+    def patchScores(self, students, dtype=None):
+        from engine.canvas import patchScores
+        with stage('Patch scores') as s:
+            patched = patchScores(self.grades, self.report, self.assignmentLabel, self.canvasScores, students, dtype)
+            self.scores.iloc[patched.index, 0] = patched.to_numpy()
+            s.rows = patched.shape[0]
+        self.saveSession()
 
     """
     Export Canvas CSV event handler
+    The export mode is asked first: the full gradebook, or a minimal CSV with only the assignment column, optionally with
+    only the students whose score changed since the last export of the session, see engine.canvas.writeDelta.
     """
     def generateButtonPressed(self):
+        label = askcombobox('Export', 'Select what to write to the Canvas CSV:', list(EXPORT_LABELS.values()), initialvalue=EXPORT_LABELS[self.exportMode])
+        modes = {text: mode for mode, text in EXPORT_LABELS.items()}
+        if label not in modes:
+            return
+        mode = self.exportMode = modes[label]
+
+        from engine.canvas import writeGradebook, writeDelta, scoreTexts, outputPath
         # Output to CSV
-        output_csv = Path(self.grade_csv).parent / '{}_parsedGrade.csv'.format(self.assignmentName)
-        self.grades.to_csv(output_csv, index=False, float_format='%.2f')
-        messagebox.showinfo(title='Finished processing', message='Written to "{}". Import this file to Canvas Gradebook.'.format(output_csv))
+        output_csv = outputPath(self.grade_csv, self.assignmentLabel, mode)
+        grades, grade_csv, assignmentLabel, scores = self.grades, self.grade_csv, self.assignmentLabel, self.scores
+        previous = self.exported.to_dict() if mode == 'changed' and self.exported is not None else None
+
+        def task(progress):
+            with stage('Export Canvas CSV') as s:
+                if mode == 'full':
+                    writeGradebook(grades, output_csv, grade_csv, scores)
+                    exported = scoreTexts(grades, assignmentLabel, scores)
+                else:
+                    exported = writeDelta(grades, output_csv, grade_csv, assignmentLabel, previous, scores)
+                s.rows = grades.shape[0]
+            return exported
+
+        def done(exported):
+            import pandas as pd
+            self.exported = pd.Series(exported, dtype=object)
+            self.saveSession()
+            messagebox.showinfo(title='Finished processing', message='Written to "{}". Import this file to Canvas Gradebook.'.format(output_csv))
+
+        self.runTask('Export Canvas CSV', task, done)
+
+    """
+    Duplicate ITSC review passed to the engine, shows all conflicts in one dialog with the policy's choice marked.
+    The user can switch the policy or click the rows to keep, and cancelling accepts the policy.
+    The selected policy is used for later imports only if the dialog is confirmed.
+    Can be called from a background task, the dialog is shown by the UI thread.
+    """
+    def reviewDuplicates(self, conflicts, kept):
+        from engine.zinc import chooseRows
+        policies = [policy for policy in POLICIES if policy != POLICY_FILE]
+        def choose(policy):
+            return chooseRows(conflicts, policy)
+        reviewed = self.callInMainThread(askduplicates, 'Duplicates', 'These ITSCs appear in several ZINC reports. Click a row to keep it instead.',
+                                         conflicts, kept, choose, policies, self.duplicatePolicy,
+                                         columns=['File', 'ITSC', 'Name', 'Score', 'Late Submission'])
+        if reviewed is None:
+            return None
+        kept, self.duplicatePolicy = reviewed
+        return kept
+
+    """
+    Values of one displayed column, one per student row of the table
+    """
+    def tableColumn(self, column) -> pd.Series:
+        if column in self.extraColumns:
+            values = self.grades['SIS Login ID'].map(self.report.drop_duplicates(subset=['SIS Login ID']).set_index('SIS Login ID')[column])
+        else:
+            values = self.grades[column]
+        return values.iloc[(2 if self.hasManualPostingRow else 1):-1]
 
     """
     Helper function to update content of table
+    If the changed columns are given, only these columns are compared and redrawn.
+    """
+    def updateTable(self, columns: list = None):
+        with stage('Update table'):
+            if columns is None or self.gradeTable.columnNames != self.displayedColumns:
+                self.gradeTable.setDataframe(self.table.iloc[(2 if self.hasManualPostingRow else 1):-1])
+                return
+            self.gradeTable.updateColumns({column: self.tableColumn(column) for column in columns})
+
+    """
+    Show the time, rows and peak memory of the recorded stages
+    """
+    def traceButtonPressed(self):
+        if self.tracePanel is None or not self.tracePanel.winfo_exists():
+            self.tracePanel = TracePanel(self, trace.summary, trace.dump)
+        self.tracePanel.refresh()
+        self.tracePanel.lift()
+
+    """
+    Run task(progress) on the worker thread and call done(result) on the UI thread once it returns.
+    The task must not touch any widget: read the inputs before and update the UI in done, or use callInMainThread.
+    It reports progress by calling progress(done, total), which raises TaskCancelled once the user cancels.
+    Errors are shown in a message box. Returns False, without running the task, if another task is still running.
+    """
+    def runTask(self, title, task, done=None) -> bool:
+        if self.task is not None:
+            messagebox.showwarning(title='Busy', message='Wait for "{}" to finish or cancel it.'.format(self.taskTitle))
+            return False
+        self.taskTitle = title
+        self.cancelled.clear()
+        self.progressBar.config(mode='indeterminate', value=0)
+        self.progressBar.start()
+        self.progressBar.grid()
+        self.cancelButton.config(state='normal')
+        self.cancelButton.grid()
+        self.task = self.executor.submit(task, self.reportProgress)
+        self.task.add_done_callback(lambda future: self.messages.put(('done', future, done)))
+        self.after(POLL_INTERVAL, self.pollTask)
+        return True
+
+    """
+    Progress callback of a background task, total is None if it is not known
+    """
+    def reportProgress(self, done, total=None):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+        self.messages.put(('progress', done, total))
+
+    """
+    Call func on the UI thread and return its result, e.g. to show a dialog from a background task.
+    """
+    def callInMainThread(self, func, *args, **kwargs):
+        if threading.current_thread() is threading.main_thread():
+            return func(*args, **kwargs)
+        reply = queue.Queue(maxsize=1)
+        self.messages.put(('call', func, args, kwargs, reply))
+        ok, result = reply.get()
+        if not ok:
+            raise result
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+        return result
+
+    """
+    Handle the messages of the running background task, then check again after POLL_INTERVAL
+    """
+    def pollTask(self):
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == 'progress':
+                _, done, total = message
+                if total:
+                    self.progressBar.stop()
+                    self.progressBar.config(mode='determinate', maximum=total, value=done)
+            elif message[0] == 'call':
+                _, func, args, kwargs, reply = message
+                try:
+                    reply.put((True, func(*args, **kwargs)))
+                except Exception as error:
+                    reply.put((False, error))
+            elif message[0] == 'done':
+                self.finishTask(message[1], message[2])
+                return
+        self.after(POLL_INTERVAL, self.pollTask)
+
+    """
+    Hide the progress bar and pass the result of the finished task to done
+    """
+    def finishTask(self, future, done):
+        title = self.taskTitle
+        self.task = None
+        self.taskTitle = None
+        self.progressBar.stop()
+        self.progressBar.grid_remove()
+        self.cancelButton.grid_remove()
+        try:
+            result = future.result()
+        except TaskCancelled:
+            return
+        except Exception as error:
+            traceback.print_exception(type(error), error, error.__traceback__)
+            messagebox.showerror(title='Error', message='{} failed:\n{}'.format(title, error))
+            return
+        if done is not None:
+            done(result)
+
+    """
+    Cancel event handler, the task stops at its next progress report
     """
-    def updateTable(self):
-        self.gradeTable.initTable(self.table.shape[0] + 1 - (3 if self.hasManualPostingRow else 2), self.table.shape[1])
-        self.gradeTable.setDataframe(self.table, 2 if self.hasManualPostingRow else 1)
\ No newline at end of file
+    def cancelButtonPressed(self):
+        self.cancelled.set()
+        self.cancelButton.config(state='disabled')
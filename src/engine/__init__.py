@@ -0,0 +1,33 @@
+"""
+Headless grade parsing engine.
+Every function in this package takes plain file paths and DataFrames, so it can be driven
+by the Tk apps, by the batch command line in main.py, or by a process pool.
+"""
+from importlib import import_module
+
+# Public functions and the submodule defining each, imported on first use so that
+# importing a submodule such as engine.trace does not pull in pandas
+EXPORTS = {
+    'engine.canvas': ['loadGradebook', 'scanGradebook', 'possibleAssignments', 'fillScores', 'unmatchedStudents', 'patchScores', 'writeGradebook', 'outputPath', 'assignmentName'],
+    'engine.lab': ['parseLabAttendance', 'parseLabZINCreports', 'parseLabQuestions', 'processLabScores', 'changedStudents', 'updateLabScores'],
+    'engine.pa': ['parsePAreport', 'scorePAreport'],
+    'engine.stats': ['scoreStats', 'scoreHistogram', 'testcaseStats', 'writeStats', 'renderHistogram'],
+    'engine.hw': ['parseHWreport'],
+    'engine.lookup': ['storeScores', 'findStudents', 'studentScores'],
+    'engine.similarity': ['rankSimilarity', 'writeSimilarity'],
+    'engine.session': ['saveSession', 'loadSession', 'deleteSession'],
+    'engine.formula': ['compileFormula'],
+    'engine.assignment': ['loadTypes', 'compileType', 'readInput', 'scoreAssignment'],
+    'engine.batch': ['runJob', 'scoreJob', 'runBatch', 'runCombined', 'loadJobs'],
+}
+_modules = {name: module for module, names in EXPORTS.items() for name in names}
+
+def __getattr__(name):
+    if name not in _modules:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(import_module(_modules[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_modules))
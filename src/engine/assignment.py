@@ -0,0 +1,163 @@
+"""
+Declarative assignment types, so a new course type needs a definition file instead of a new app.
+
+A type is a JSON file in TYPES_DIR, holding one definition or a list of them, e.g.
+    {
+        "name": "COMP2611 Quiz",
+        "inputs": {
+            "quiz": {"title": "Quiz gradesheet(s)", "key": "SIS Login ID"},
+            "zinc": {"title": "ZINC report(s)", "zinc": true}
+        },
+        "parameters": {"zincMax": 100},
+        "formula": "quiz.Total + max(zinc.Score / zincMax * 10, quiz.Bonus)",
+        "base": "quiz"
+    }
+
+Each input is imported from one or more Excel files, which are concatenated:
+- title: (optional) text of its import button, defaults to the name of the input
+- sheet: (optional) sheet name or index, defaults to the first sheet
+- key: (optional) column identifying the students, defaults to 'SIS Login ID', or 'ITSC' for ZINC reports
+- keyType: (optional) 'email' if the key is the ITSC email, 'itsc' if it is the ITSC only
+- zinc: (optional) true for ZINC reports, whose duplicate ITSCs are resolved like the Lab and PA reports
+Only the columns used by the formula and the displayed columns are kept, with the first row of each student.
+
+The formula is compiled by engine.formula, with the parameters as variables. Numeric columns of students missing
+from an input count as 0. The students scored are the ones of the base input, or of every input if there is none.
+'display' optionally lists the columns shown next to the scores, e.g. ["zinc.Score"], defaulting to the ones in the formula.
+"""
+from pathlib import Path
+import json
+import os
+import sys
+
+# pandas and the formula compiler are imported by the functions using them, so the selection window can list
+# the types without loading them
+
+# Location of the definitions, can be overridden by an environment variable
+TYPES_DIR = os.environ.get('GRADEPARSER_TYPES', str(Path.home() / '.config' / 'gradeparser' / 'types'))
+
+REQUIRED_KEYS = ['name', 'inputs', 'formula']
+
+"""
+Definitions of the assignment types in a directory, by name, in the order of the file names.
+Files that cannot be read or lack a required key are skipped with a warning.
+"""
+def loadTypes(types_dir=None) -> dict[str, dict]:
+    types = {}
+    directory = Path(types_dir or TYPES_DIR)
+    if not directory.is_dir():
+        return types
+    for path in sorted(directory.glob('*.json')):
+        try:
+            with open(path) as f:
+                definitions = json.load(f)
+        except (OSError, ValueError) as e:
+            print('[WARNING] Assignment type "{}" skipped: {}'.format(path, e), file=sys.stderr)
+            continue
+        for definition in definitions if isinstance(definitions, list) else [definitions]:
+            missing = [key for key in REQUIRED_KEYS if key not in definition]
+            if missing:
+                print('[WARNING] Assignment type in "{}" skipped: missing {}'.format(path, missing), file=sys.stderr)
+                continue
+            types[definition['name']] = definition
+    return types
+
+"""
+Check a definition and compile its formula, raising ValueError (or engine.formula.FormulaError) if it is invalid.
+"""
+def compileType(definition: dict):
+    from engine.formula import compileFormula
+    inputs = definition['inputs']
+    invalid = [name for name in inputs if not name.isidentifier()]
+    if invalid:
+        raise ValueError('Input names {} of "{}" are not identifiers'.format(invalid, definition['name']))
+    formula = compileFormula(definition['formula'], definition.get('parameters', {}))
+    unknown = sorted({source for source, _ in list(formula.columns.values()) + displayedColumns(definition)} - set(inputs))
+    if unknown:
+        raise ValueError('Formula of "{}" uses unknown inputs {}, expected one of {}'.format(definition['name'], unknown, list(inputs)))
+    if definition.get('base') is not None and definition['base'] not in inputs:
+        raise ValueError('Base input "{}" of "{}" is not an input'.format(definition['base'], definition['name']))
+    return formula
+
+"""
+Columns shown next to the scores as (input, column), given as input.column in 'display'.
+Without 'display', these are the columns of the formula, in the order they appear.
+"""
+def displayedColumns(definition: dict, formula=None) -> list[tuple[str, str]]:
+    if 'display' in definition:
+        return [tuple(column.split('.', 1)) for column in definition['display']]
+    return list(dict.fromkeys(formula.columns.values())) if formula is not None else []
+
+"""
+Header of each displayed column: the column name, prefixed by the input when several inputs have a column of that name.
+"""
+def displayedHeaders(columns: list[tuple[str, str]]) -> list[str]:
+    names = [column for _, column in columns]
+    return [column if names.count(column) == 1 else '{} {}'.format(source, column) for source, column in columns]
+
+"""
+Read the Excel files of one input, keeping the 'SIS Login ID' and the columns used by the formula and the display.
+ZINC reports are deduplicated by the policy and the optional review, see engine.zinc.resolveDuplicates.
+progress(done, total) is called after each file.
+"""
+def readInput(definition: dict, name, paths, formula, policy=None, preferFile=None, review=None, progress=None):
+    import pandas as pd
+    from engine.cache import readExcels
+    from engine.zinc import readZINCreports, DEFAULT_POLICY
+
+    spec = definition['inputs'][name]
+    columns = list(dict.fromkeys(formula.inputColumns().get(name, []) +
+                                 [column for source, column in displayedColumns(definition, formula) if source == name]))
+    if spec.get('zinc'):
+        sheet = readZINCreports(paths, policy or DEFAULT_POLICY, preferFile, review, progress)
+        key = spec.get('key', 'ITSC')
+        keyType = spec.get('keyType', 'itsc')
+    else:
+        sheet = pd.concat(readExcels(paths, sheet_name=spec.get('sheet', 0), progress=progress))
+        key = spec.get('key', 'SIS Login ID')
+        keyType = spec.get('keyType', 'email')
+
+    missing = [column for column in [key] + columns if column not in sheet.columns]
+    if missing:
+        raise KeyError('Columns {} of input "{}" not found in {}'.format(missing, name, ', '.join(Path(path).name for path in paths)))
+    sheet = sheet.dropna(subset=[key])
+    logins = sheet[key].astype(str).str.strip()
+    if keyType == 'itsc':
+        logins = logins + '@connect.ust.hk'
+    sheet = pd.concat([logins.rename('SIS Login ID'), sheet.loc[:, [column for column in columns if column != 'SIS Login ID']]], axis=1)
+    sheet.drop_duplicates(subset=['SIS Login ID'], inplace=True)
+    sheet.reset_index(drop=True, inplace=True)
+    return sheet
+
+"""
+Calculate the scores of an assignment type from its imported inputs, by name.
+parameters override the defaults of the definition.
+Returns the report keyed by 'SIS Login ID', with the displayed columns and the score in a column named after the assignment.
+"""
+def scoreAssignment(definition: dict, formula, inputs: dict, assignmentLabel, parameters: dict = None):
+    import numpy as np
+    import pandas as pd
+    from engine.canvas import SCORE_DTYPE
+
+    parameters = {**definition.get('parameters', {}), **(parameters or {})}
+    base = definition.get('base')
+    if base is not None:
+        logins = pd.Index(inputs[base]['SIS Login ID'])
+    else:
+        logins = pd.Index(pd.concat([sheet['SIS Login ID'] for sheet in inputs.values()])).drop_duplicates()
+
+    displayed = displayedColumns(definition, formula)
+    values = {}
+    for source, column in list(dict.fromkeys(list(formula.columns.values()) + displayed)):
+        sheet = inputs[source]
+        series = pd.Series(sheet[column].to_numpy(), index=sheet['SIS Login ID']).reindex(logins)
+        if pd.api.types.is_numeric_dtype(series):
+            series = series.fillna(0)
+        values[source, column] = series.to_numpy()
+
+    report = pd.DataFrame({'SIS Login ID': logins.to_numpy()})
+    for header, key in zip(displayedHeaders(displayed), displayed):
+        report[header] = values[key]
+    scores = formula.evaluate(values, parameters, len(logins))
+    report[assignmentLabel] = pd.array(np.round(scores, 2), dtype=SCORE_DTYPE)
+    return report
@@ -0,0 +1,187 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import sys
+import pandas as pd
+
+from engine import trace
+from engine.trace import stage, traced
+from engine.canvas import loadGradebook, fillScores, unmatchedStudents, writeGradebook, writeDelta, readExported, outputPath, EXPORT_FULL, EXPORT_CHANGED, EXPORT_MODES
+from engine.lab import parseLabAttendance, parseLabZINCreports, parseLabQuestions, processLabScores
+from engine.pa import parsePAreport
+from engine.hw import parseHWreport, SID_COLUMN, TOT_COLUMN
+from engine.zinc import DEFAULT_POLICY
+from engine.assignment import loadTypes, compileType, readInput, scoreAssignment
+
+LAB = 'lab'
+PA = 'pa'
+HW = 'hw'
+JOB_TYPES = [LAB, PA, HW]
+
+# Name of the output CSV of several assignments, see runCombined
+COMBINED_OUTPUT = 'Combined'
+
+"""
+Run a single job without any user interaction and return the path of the output CSV.
+
+A job is a dict with the following keys:
+- type: one of 'lab', 'pa' or 'hw'
+- canvas: path to the Canvas CSV file
+- assignment: name of the assignment column in Canvas, e.g. 'Lab 2 (309931)'
+- output: (optional) path of the output CSV, defaults to '<assignment>_parsedGrade.csv' next to the Canvas CSV,
+  or '<assignment>_delta.csv' for the minimal exports
+- export: (optional) 'full' (default) for the whole gradebook, 'column' for only the identity and assignment columns,
+  or 'changed' for only the students whose score changed since the export given as previous, see engine.canvas.writeDelta
+- previous: (changed) CSV exported earlier for the assignment, every student is written without it
+- zincMax: (lab, pa) maximum ZINC score, defaults to 100
+- zinc: (lab, pa) list of ZINC reports
+- duplicatePolicy: (lab, pa) how to resolve duplicate ITSCs in ZINC reports, see engine.zinc.chooseRows, defaults to 'latest'
+- preferFile: (lab, pa) ZINC report to prefer with the 'file' policy
+- attendance: (lab) list of attendance sheets
+- question: (lab) question score sheet
+- numLabs: (lab) number of lab sessions, defaults to the number of ZINC reports
+- report: (hw) homework gradefile
+- sidColumn, totalColumn: (hw) column names of the ITSC emails and total scores, defaulting to the default names or
+  the columns remembered for the template of the gradefile, see engine.hw.resolveColumns
+
+The type can also be the name of an assignment type defined in engine.assignment.TYPES_DIR, with the keys:
+- inputs: dict of the list of Excel files of each input of the type
+- parameters: (optional) dict of parameters overriding the defaults of the type
+- duplicatePolicy, preferFile: (optional) as above, for the inputs of ZINC reports
+"""
+def runJob(job: dict) -> str:
+    assignmentLabel = job['assignment']
+    with stage('Load Canvas CSV') as s:
+        grades, _ = loadGradebook(job['canvas'], [assignmentLabel])
+        s.rows = grades.shape[0]
+    report = scoreJob(job)
+    with stage('Merge scores') as s:
+        scores = mergeReport(grades, report, job)
+        s.rows = report.shape[0]
+
+    mode = job.get('export', EXPORT_FULL)
+    if mode not in EXPORT_MODES:
+        raise ValueError('Unknown export mode "{}", expected one of {}'.format(mode, EXPORT_MODES))
+    output_csv = job.get('output') or outputPath(job['canvas'], assignmentLabel, mode)
+    with stage('Export Canvas CSV') as s:
+        if mode == EXPORT_FULL:
+            writeGradebook(grades, output_csv, job['canvas'], scores)
+        else:
+            previous = readExported(job['previous'], assignmentLabel) if mode == EXPORT_CHANGED and job.get('previous') else None
+            writeDelta(grades, output_csv, job['canvas'], assignmentLabel, previous, scores)
+        s.rows = grades.shape[0]
+    return str(output_csv)
+
+"""
+Parse the gradesheets of a job and calculate its scores, without loading the gradebook.
+Returns the report with the scores in a column named after the assignment, keyed by 'SIS Login ID'.
+"""
+def scoreJob(job: dict) -> pd.DataFrame:
+    with stage('Calculate scores of {}'.format(job['assignment'])) as s:
+        jobType = job['type']
+        assignmentLabel = job['assignment']
+        if jobType == LAB:
+            attendance = parseLabAttendance(job['attendance'])
+            zinc = parseLabZINCreports(job['zinc'], job.get('zincMax', 100), job.get('duplicatePolicy', DEFAULT_POLICY), job.get('preferFile'))
+            question = parseLabQuestions(job['question'], job.get('numLabs', len(job['zinc'])))
+            report = processLabScores(attendance, question, zinc, assignmentLabel)
+        elif jobType == PA:
+            _, report = parsePAreport(job['zinc'], assignmentLabel, job.get('zincMax', 100), job.get('duplicatePolicy', DEFAULT_POLICY), job.get('preferFile'))
+        elif jobType == HW:
+            columns = {key: job[name] for key, name in [(SID_COLUMN, 'sidColumn'), (TOT_COLUMN, 'totalColumn')] if job.get(name)}
+            report = parseHWreport(job['report'], assignmentLabel, columns=columns)
+        else:
+            types = loadTypes()
+            if jobType not in types:
+                raise ValueError('Unknown job type "{}", expected one of {}'.format(jobType, JOB_TYPES + list(types)))
+            definition = types[jobType]
+            formula = compileType(definition)
+            inputs = {name: readInput(definition, name, job['inputs'][name], formula, job.get('duplicatePolicy', DEFAULT_POLICY), job.get('preferFile'))
+                      for name in definition['inputs']}
+            report = scoreAssignment(definition, formula, inputs, assignmentLabel, job.get('parameters'))
+        s.rows = report.shape[0]
+    return report
+
+"""
+Fill the scores of a job into the gradebook, warning about students who are not in Canvas.
+Returns the scores of the students of the gradebook, see engine.canvas.fillScores.
+"""
+def mergeReport(grades: pd.DataFrame, report: pd.DataFrame, job: dict) -> pd.DataFrame:
+    assignmentLabel = job['assignment']
+    _, extra = unmatchedStudents(grades, report)
+    if extra:
+        print('[WARNING] {}: {} student(s) not in Canvas were skipped: {}'.format(assignmentLabel, len(extra), ', '.join(extra)), file=sys.stderr)
+    return fillScores(grades, report, assignmentLabel)
+
+"""
+Run jobs in parallel on a process pool.
+Returns a list of (job, output path, error message) in the same order as the jobs.
+A failing job does not stop the others.
+"""
+def runBatch(jobs: list[dict], workers: int = None) -> list[tuple[dict, str, str]]:
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(traced, runJob, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                results.append((job, tracedResult(future), None))
+            except Exception as e:
+                results.append((job, None, '{}: {}'.format(type(e).__name__, e)))
+    return results
+
+"""
+Run several jobs on the same Canvas CSV in one pass and write a single CSV with all their assignment columns.
+The gradesheets of the jobs are parsed in parallel on a process pool while the gradebook is loaded once,
+with only the identity and assignment columns. The 'output', 'export' and 'previous' keys of the jobs are ignored,
+the CSV is written to output_csv, by default 'Combined_parsedGrade.csv' next to the Canvas CSV.
+
+Returns a list of (job, output path, error message) in the same order as the jobs, like runBatch.
+The columns of failing jobs are copied unchanged from the Canvas CSV.
+"""
+def runCombined(jobs: list[dict], output_csv=None, workers: int = None) -> list[tuple[dict, str, str]]:
+    canvases = {job['canvas'] for job in jobs}
+    if len(canvases) != 1:
+        raise ValueError('Combined jobs must use the same Canvas CSV, got {}'.format(sorted(canvases)))
+    labels = [job['assignment'] for job in jobs]
+    duplicated = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicated:
+        raise ValueError('Assignments {} appear in several jobs'.format(duplicated))
+    grade_csv = jobs[0]['canvas']
+    output_csv = output_csv or outputPath(grade_csv, COMBINED_OUTPUT)
+
+    results = []
+    failed = []
+    scores = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(traced, scoreJob, job) for job in jobs]
+        with stage('Load Canvas CSV') as s:
+            grades, _ = loadGradebook(grade_csv, labels)
+            s.rows = grades.shape[0]
+        for job, future in zip(jobs, futures):
+            try:
+                scores[job['assignment']] = mergeReport(grades, tracedResult(future), job)[job['assignment']].array
+                results.append((job, str(output_csv), None))
+            except Exception as e:
+                failed.append(job['assignment'])
+                results.append((job, None, '{}: {}'.format(type(e).__name__, e)))
+
+    if len(failed) < len(jobs):
+        with stage('Export Canvas CSV') as s:
+            writeGradebook(grades.drop(columns=failed), output_csv, grade_csv, pd.DataFrame(scores))
+            s.rows = grades.shape[0]
+    return results
+
+"""
+Result of a job run by engine.trace.traced on a worker process, adding the stages it recorded to the trace of this process.
+"""
+def tracedResult(future):
+    result, events = future.result()
+    trace.events.extend(events)
+    return result
+
+"""
+Load a list of jobs from a JSON file, which contains either a single job or a list of jobs.
+"""
+def loadJobs(jobs_json) -> list[dict]:
+    with open(jobs_json) as f:
+        jobs = json.load(f)
+    return jobs if isinstance(jobs, list) else [jobs]
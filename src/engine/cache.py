@@ -0,0 +1,264 @@
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import multiprocessing
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'feather'
+except ImportError:
+    CACHE_FORMAT = 'pickle'
+
+# Cache location and size, can be overridden by environment variables.
+# Set GRADEPARSER_CACHE to an empty string to disable the cache.
+CACHE_DIR = os.environ.get('GRADEPARSER_CACHE', str(Path.home() / '.cache' / 'gradeparser'))
+CACHE_SIZE = int(os.environ.get('GRADEPARSER_CACHE_SIZE', 256 * 1024 * 1024))
+
+# Number of recently read sheets also kept in memory, so re-importing an unchanged file costs only its hash
+MEMORY_ENTRIES = 16
+_memory: OrderedDict = OrderedDict()
+
+# Hashes of the files hashed by this process, by path, with the modification time and size they were hashed at
+_hashes: dict[str, tuple] = {}
+
+"""
+SHA-256 of the content of a file, so renamed or re-downloaded copies of a gradesheet share cache entries.
+A file is hashed again only if its modification time or size changed since it was last hashed by this process.
+"""
+def fileHash(path) -> str:
+    stat = os.stat(path)
+    key, signature = os.path.abspath(path), (stat.st_mtime_ns, stat.st_size)
+    remembered = _hashes.get(key)
+    if remembered is not None and remembered[0] == signature:
+        return remembered[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    _hashes[key] = (signature, digest.hexdigest())
+    return _hashes[key][1]
+
+"""
+Path of the cache entry for one sheet of a file, keyed by the file content, the sheet and the read options.
+"""
+def cachePath(path, sheet_name, options: dict) -> Path:
+    key = '{}|{!r}|{!r}'.format(fileHash(path), sheet_name, sorted(options.items()))
+    return Path(CACHE_DIR) / '{}.{}'.format(hashlib.sha256(key.encode()).hexdigest(), CACHE_FORMAT)
+
+"""
+The cached DataFrame of one sheet, or None if it is not in the cache.
+Sheets read recently are returned from memory, as a copy so callers may modify it.
+"""
+def readCached(path, sheet_name=0, **options) -> pd.DataFrame:
+    if not CACHE_DIR:
+        return None
+    entry = cachePath(path, sheet_name, options)
+    if entry in _memory:
+        _memory.move_to_end(entry)
+        return _memory[entry].copy()
+    try:
+        if CACHE_FORMAT == 'feather':
+            df = pd.read_feather(entry)
+            # Feather reads missing strings back as None, while the parsed sheet has NaN
+            for column in df.columns[df.dtypes == object]:
+                df[column] = df[column].where(df[column].notna())
+        else:
+            df = pd.read_pickle(entry)
+        os.utime(entry)
+        remember(entry, df)
+        return df
+    except (OSError, ValueError, EOFError):
+        return None
+
+"""
+Store the DataFrame parsed from one sheet, so that readCached finds it with the same arguments.
+"""
+def storeCached(df: pd.DataFrame, path, sheet_name=0, **options):
+    if not CACHE_DIR:
+        return
+    entry = cachePath(path, sheet_name, options)
+    remember(entry, df)
+    temp = entry.with_suffix('.{}.tmp'.format(os.getpid()))
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        if CACHE_FORMAT == 'feather':
+            df.to_feather(temp)
+        else:
+            df.to_pickle(temp)
+        os.replace(temp, entry)
+        evict()
+    except (OSError, ValueError, TypeError):
+        # Frames that cannot be stored, e.g. non-string column names in Feather, are simply not cached
+        temp.unlink(missing_ok=True)
+
+"""
+Keep a copy of a sheet in memory under its cache entry, dropping the least recently used sheets beyond MEMORY_ENTRIES.
+"""
+def remember(entry: Path, df: pd.DataFrame):
+    _memory[entry] = df.copy()
+    _memory.move_to_end(entry)
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+"""
+Read one sheet of an Excel file like pd.read_excel, through the on-disk cache.
+The parsed DataFrame is stored as Feather if pyarrow is installed, otherwise as a pickle.
+"""
+def readExcel(path, sheet_name=0, **options) -> pd.DataFrame:
+    df = readCached(path, sheet_name, **options)
+    if df is None:
+        df = pd.read_excel(path, sheet_name=sheet_name, **options)
+        storeCached(df, path, sheet_name, **options)
+    return df
+
+"""
+Whether this is a worker process, e.g. of engine.batch.runBatch, whose pool already keeps every core busy.
+Sheets are then parsed in this process rather than on a pool nested in it.
+"""
+def inWorker() -> bool:
+    return multiprocessing.parent_process() is not None
+
+"""
+Read the same sheet of several Excel files, in the given order.
+Files missing from the cache are parsed concurrently on a process pool, one file per worker, unless inWorker().
+If given, progress(done, total) is called after each file. An exception raised by it, e.g. to cancel, stops the pool.
+"""
+def readExcels(paths, sheet_name=0, workers=None, progress=None, **options) -> list[pd.DataFrame]:
+    paths = list(paths)
+    dfs = [readCached(path, sheet_name, **options) for path in paths]
+    missing = [i for i, df in enumerate(dfs) if df is None]
+    if progress is not None:
+        progress(len(paths) - len(missing), len(paths))
+    if len(missing) == 1 or inWorker():
+        for i in missing:
+            dfs[i] = readExcel(paths[i], sheet_name, **options)
+            if progress is not None:
+                progress(sum(df is not None for df in dfs), len(paths))
+    elif missing:
+        executor = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(missing)))
+        try:
+            futures = {executor.submit(readExcel, paths[i], sheet_name, **options): i for i in missing}
+            for future in as_completed(futures):
+                i = futures[future]
+                dfs[i] = future.result()
+                # The worker process stored the sheet on disk, keep it in the memory of this process too
+                if CACHE_DIR:
+                    remember(cachePath(paths[i], sheet_name, options), dfs[i])
+                if progress is not None:
+                    progress(sum(df is not None for df in dfs), len(paths))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    if progress is not None:
+        progress(len(paths), len(paths))
+    return dfs
+
+"""
+Whether one sheet of a file is in the cache, without reading it.
+"""
+def isCached(path, sheet_name=0, **options) -> bool:
+    if not CACHE_DIR:
+        return False
+    entry = cachePath(path, sheet_name, options)
+    return entry in _memory or entry.exists()
+
+"""
+Read the same sheet of several Excel files like readExcels, yielding each DataFrame in the given order as soon as it is read,
+so the caller can process one file at a time. At most one file per worker is parsed ahead of the one being processed,
+so the sheets held in memory are bounded by the number of workers instead of the number of files.
+If given, progress(done, total) is called after each file. Like readExcels, files are parsed in this process if inWorker().
+"""
+def iterExcels(paths, sheet_name=0, workers=None, progress=None, **options):
+    paths = list(paths)
+    missing = [i for i, path in enumerate(paths) if not isCached(path, sheet_name, **options)]
+    if len(missing) < 2 or inWorker():
+        for i, path in enumerate(paths):
+            df = readExcel(path, sheet_name, **options)
+            if progress is not None:
+                progress(i + 1, len(paths))
+            yield df
+        return
+
+    workers = min(workers or os.cpu_count(), len(missing))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+    queued = iter(missing)
+    try:
+        for i, path in enumerate(paths):
+            # Keep every worker busy with the next files missing from the cache
+            while len(pending) < workers:
+                j = next(queued, None)
+                if j is None:
+                    break
+                pending[j] = executor.submit(readExcel, paths[j], sheet_name, **options)
+            if i in pending:
+                df = pending.pop(i).result()
+                if CACHE_DIR:
+                    remember(cachePath(path, sheet_name, options), df)
+            else:
+                df = readExcel(path, sheet_name, **options)
+            if progress is not None:
+                progress(i + 1, len(paths))
+            yield df
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+"""
+Bytes stored under a key by storeBytes, or None if they are not in the cache.
+"""
+def readBytes(key) -> bytes:
+    if not CACHE_DIR:
+        return None
+    entry = Path(CACHE_DIR) / '{}.bin'.format(key)
+    try:
+        data = entry.read_bytes()
+        os.utime(entry)
+        return data
+    except OSError:
+        return None
+
+"""
+Store bytes computed from files, e.g. the fingerprints of engine.similarity, under a key derived from their content.
+They are evicted with the sheets, but not on every store: call evict once a batch of entries is stored.
+"""
+def storeBytes(data: bytes, key):
+    if not CACHE_DIR:
+        return
+    entry = Path(CACHE_DIR) / '{}.bin'.format(key)
+    temp = entry.with_suffix('.{}.tmp'.format(os.getpid()))
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        temp.write_bytes(data)
+        os.replace(temp, entry)
+    except OSError:
+        temp.unlink(missing_ok=True)
+
+"""
+Remove the least recently used entries, sheets and bytes alike, until the cache fits in CACHE_SIZE bytes.
+"""
+def evict(maxSize=None):
+    if not CACHE_DIR:
+        return
+    maxSize = CACHE_SIZE if maxSize is None else maxSize
+    entries = []
+    for entry in [*Path(CACHE_DIR).glob('*.' + CACHE_FORMAT), *Path(CACHE_DIR).glob('*.bin')]:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda e: e[0]):
+        if total <= maxSize:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+
+"""
+Remove every cache entry.
+"""
+def clearCache():
+    _memory.clear()
+    evict(0)
@@ -0,0 +1,306 @@
+from pathlib import Path
+import csv
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# Columns identifying a student, always loaded with the assignment columns
+IDENTITY_COLUMNS = ['Student', 'ID', 'SIS User ID', 'SIS Login ID', 'Section']
+
+# dtype of the score columns: 4 bytes per score, with blanks kept as <NA>
+SCORE_DTYPE = 'Float32'
+
+# Rows parsed at a time when the whole gradebook is loaded, so only one chunk is held as Python strings
+CHUNK_ROWS = 1000
+
+# Export modes: the whole gradebook, only the identity columns and the assignment column,
+# or only the rows of the students whose score changed since the previous export, see writeDelta
+EXPORT_FULL = 'full'
+EXPORT_COLUMN = 'column'
+EXPORT_CHANGED = 'changed'
+EXPORT_MODES = [EXPORT_FULL, EXPORT_COLUMN, EXPORT_CHANGED]
+
+"""
+Load the Canvas Grade Export .csv file.
+If columns are given, only these and the identity columns are parsed, which is much faster for gradebooks with
+hundreds of assignments. Write such a gradebook with writeGradebook(grades, output_csv, grade_csv).
+The columns are stored compactly, see compactGradebook. The whole gradebook is parsed in chunks of CHUNK_ROWS rows,
+each stored compactly before the next one is parsed.
+Returns the gradebook and whether Canvas has Manual Posting enabled (an extra row below the header).
+"""
+def loadGradebook(grade_csv, columns=None) -> tuple[pd.DataFrame, bool]:
+    if columns is None:
+        # The header rows are read apart, so the student rows of numeric columns are parsed as numbers directly
+        header = pd.read_csv(grade_csv, nrows=2)
+        headerRows = 1 if header['Student'][0] == '    Points Possible' else 2
+        chunks = [compactGradebook(header.iloc[:headerRows].astype({'ID': 'Int64', 'SIS User ID': 'Int64'}))]
+        for chunk in pd.read_csv(grade_csv, skiprows=range(1, headerRows + 1), chunksize=CHUNK_ROWS, low_memory=False):
+            chunk.index += headerRows
+            chunks.append(compactGradebook(chunk.astype({'ID': 'Int64', 'SIS User ID': 'Int64'})))
+        grades = pd.concat(chunks)
+        # Chunks with different sections are concatenated as text
+        grades['Section'] = grades['Section'].astype('category')
+    else:
+        usecols = IDENTITY_COLUMNS + [column for column in columns if column not in IDENTITY_COLUMNS]
+        grades = pd.read_csv(grade_csv, usecols=usecols, engine=CSV_ENGINE, encoding='utf-8-sig')
+        grades = grades.loc[:, [column for column in grades.columns if column in usecols]]
+        # The pyarrow engine keeps empty text fields as '' instead of NaN
+        grades = grades.mask(grades.astype(object).eq(''))
+        grades = compactGradebook(grades.astype({'ID': 'Int64', 'SIS User ID': 'Int64'}))
+    hasManualPostingRow = (grades['Student'][0] != '    Points Possible')
+    return grades, hasManualPostingRow
+
+"""
+Store the gradebook compactly: 'Section' as a categorical, the names and 'SIS Login ID's as interned strings,
+and the assignment columns as SCORE_DTYPE instead of Python strings.
+Rows without a 'SIS Login ID' are the 'Manual Posting' and 'Points Possible' rows of Canvas, which are blank in the
+score columns and copied from the Canvas CSV by writeGradebook. Columns with other text in the student rows,
+e.g. 'EX' for excused, are kept as they are so that text is not overwritten.
+"""
+def compactGradebook(grades: pd.DataFrame) -> pd.DataFrame:
+    students = grades['SIS Login ID'].notna()
+    allStudents = students.all()
+    columns = {}
+    for column in grades.columns:
+        values = grades[column]
+        if column in ['Student', 'SIS Login ID']:
+            values = pd.Series([sys.intern(value) if isinstance(value, str) else value for value in values], index=grades.index, dtype=object)
+        elif column == 'Section':
+            values = values.astype('category')
+        elif column not in IDENTITY_COLUMNS:
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                values = values if allStudents else values.where(students)
+            else:
+                text = values if allStudents else values.where(students)
+                values = pd.to_numeric(text, errors='coerce')
+                if values.isna().sum() != text.isna().sum():
+                    values = grades[column]
+            if pd.api.types.is_numeric_dtype(values):
+                values = values.astype(SCORE_DTYPE)
+        columns[column] = values
+    return pd.DataFrame(columns, index=grades.index)
+
+"""
+Bytes used by the gradebook, including the strings of its text columns.
+"""
+def memoryUsage(grades: pd.DataFrame) -> int:
+    return int(grades.memory_usage(index=True, deep=True).sum())
+
+"""
+Columns with the most number of blanks are the candidates for import.
+"""
+def possibleAssignments(grades: pd.DataFrame) -> list[str]:
+    gradesNanCount = grades.drop(index=0).isna().sum()
+    return list(gradesNanCount.loc[gradesNanCount == gradesNanCount.max()].index)
+
+"""
+Scan the Canvas CSV once in chunks without keeping it in memory, counting the blanks of every column.
+Returns the candidates for import as possibleAssignments does, and whether Canvas has Manual Posting enabled.
+If given, progress(rows, None) is called after each chunk, since the total number of rows is not known in advance.
+"""
+def scanGradebook(grade_csv, chunksize=5000, progress=None) -> tuple[list[str], bool]:
+    blanks = None
+    hasManualPostingRow = True
+    rows = 0
+    for chunk in pd.read_csv(grade_csv, chunksize=chunksize, low_memory=False):
+        rows += chunk.shape[0]
+        if progress is not None:
+            progress(rows, None)
+        if blanks is None:
+            hasManualPostingRow = (chunk['Student'].iloc[0] != '    Points Possible')
+            blanks = chunk.iloc[1:].isna().sum()
+        else:
+            blanks += chunk.isna().sum()
+    return list(blanks.loc[blanks == blanks.max()].index), hasManualPostingRow
+
+"""
+Scores as dtype, SCORE_DTYPE by default, with text that is not a number treated as blank.
+"""
+def scoreColumn(values: pd.Series, dtype=None) -> pd.Series:
+    return pd.to_numeric(values, errors='coerce').astype(dtype or SCORE_DTYPE)
+
+"""
+Fill the scores of one assignment into the gradebook, with absent students receiving 0.
+The scores DataFrame must contain 'SIS Login ID' and the assignment column, as numbers or text converted by scoreColumn.
+Rows without a 'SIS Login ID', i.e. the Canvas header rows, are left blank.
+
+Scores are looked up by a hash index on 'SIS Login ID' and only the blank cells of the assignment column are written,
+so the cost does not depend on the width of the gradebook.
+Returns the scores of the gradebook rows, indexed by 'SIS Login ID'.
+"""
+def fillScores(grades: pd.DataFrame, scores: pd.DataFrame, assignmentLabel: str, dtype=None) -> pd.DataFrame:
+    lookup = scoreColumn(scores.drop_duplicates(subset=['SIS Login ID']).set_index('SIS Login ID')[assignmentLabel], dtype)
+    values = grades['SIS Login ID'].map(lookup).astype(lookup.dtype)
+    column = grades[assignmentLabel]
+    grades[assignmentLabel] = column.mask(column.isna() & grades['SIS Login ID'].notna(), values.fillna(0))
+    return pd.DataFrame({assignmentLabel: values.array}, index=pd.Index(grades['SIS Login ID']))
+
+"""
+Rewrite the scores of some students after a re-import, leaving the rest of the gradebook untouched.
+original is the assignment column as loaded from Canvas: its non-blank cells are kept as fillScores does.
+Returns the new scores of the patched rows, indexed by their position in the gradebook.
+"""
+def patchScores(grades: pd.DataFrame, scores: pd.DataFrame, assignmentLabel: str, original: pd.Series, students, dtype=None) -> pd.Series:
+    rows = np.flatnonzero(grades['SIS Login ID'].isin(students))
+    lookup = scoreColumn(scores.drop_duplicates(subset=['SIS Login ID']).set_index('SIS Login ID')[assignmentLabel], dtype)
+    values = grades['SIS Login ID'].iloc[rows].map(lookup).astype(lookup.dtype)
+    column = original.iloc[rows]
+    grades.iloc[rows, grades.columns.get_loc(assignmentLabel)] = column.mask(column.isna(), values.fillna(0)).array
+    return pd.Series(values.array, index=rows)
+
+"""
+Students of the gradebook without a score, and 'SIS Login ID's of the scores that are not in the gradebook.
+Rows without a 'SIS User ID', such as Points Possible and the test student, are not counted as students.
+"""
+def unmatchedStudents(grades: pd.DataFrame, scores: pd.DataFrame) -> tuple[list[str], list[str]]:
+    students = grades.loc[grades['SIS User ID'].notna(), 'SIS Login ID']
+    scored = pd.Index(scores['SIS Login ID'].dropna().unique())
+    unmatched = students.loc[~students.isin(scored)]
+    extra = scored[~scored.isin(grades['SIS Login ID'])]
+    return list(unmatched), list(extra)
+
+"""
+Path of the output CSV, next to the Canvas CSV. The minimal exports of writeDelta are written to '<assignment>_delta.csv'.
+"""
+def outputPath(grade_csv, assignmentLabel, mode=EXPORT_FULL) -> Path:
+    return Path(grade_csv).parent / '{}_{}.csv'.format(assignmentName(assignmentLabel), 'parsedGrade' if mode == EXPORT_FULL else 'delta')
+
+"""
+Write the gradebook to a CSV that can be imported to Canvas Gradebook.
+If the original Canvas CSV is given, it is copied row by row with the non-identity columns of the gradebook replaced,
+so a gradebook loaded with only some columns still produces the full CSV. Blank cells of the gradebook, such as its
+header rows, and scores equal to the number in the Canvas CSV keep their original text.
+If the scores returned by fillScores are given, with one column per assignment, the students without a score are written
+as '0', see formatColumn.
+"""
+def writeGradebook(grades: pd.DataFrame, output_csv, grade_csv=None, scores: pd.DataFrame = None):
+    if grade_csv is None:
+        grades.to_csv(output_csv, index=False, float_format='%.2f')
+        return
+
+    replaced = [column for column in grades.columns if column not in IDENTITY_COLUMNS]
+    values = [formatColumn(grades[column], missingScores(scores, column)) for column in replaced]
+    with open(grade_csv, newline='', encoding='utf-8-sig') as fin, open(output_csv, 'w', newline='', encoding='utf-8') as fout:
+        reader = csv.reader(fin)
+        writer = csv.writer(fout, lineterminator=os.linesep)
+        header = next(reader)
+        positions = [header.index(column) for column in replaced]
+        writer.writerow(header)
+        rows = 0
+        for row in reader:
+            if not row:
+                continue
+            if rows < grades.shape[0]:
+                for position, column in zip(positions, values):
+                    value = column[rows]
+                    if value is not None and not sameScore(row[position], value):
+                        row[position] = value
+            rows += 1
+            writer.writerow(row)
+    if rows != grades.shape[0]:
+        raise ValueError('{} has {} rows but the gradebook has {}'.format(grade_csv, rows, grades.shape[0]))
+
+"""
+Write a minimal CSV for Canvas import, with only the identity columns and the assignment column, so Canvas does not
+compare every other column and the scores entered meanwhile by other graders are left alone.
+The Canvas CSV is copied row by row as in writeGradebook, keeping its header rows such as Points Possible.
+If previous maps the 'SIS Login ID' of students to the text of their score in an earlier export, only the students whose
+score changed since, or who were not exported, are written. scores are the scores returned by fillScores, as in writeGradebook.
+Returns the text of the score of every student, to be given as previous to the next export.
+"""
+def writeDelta(grades: pd.DataFrame, output_csv, grade_csv, assignmentLabel, previous: dict = None, scores: pd.DataFrame = None) -> dict[str, str]:
+    logins = grades['SIS Login ID'].to_numpy(dtype=object, na_value=None)
+    values = formatColumn(grades[assignmentLabel], missingScores(scores, assignmentLabel))
+    with open(grade_csv, newline='', encoding='utf-8-sig') as fin, open(output_csv, 'w', newline='', encoding='utf-8') as fout:
+        reader = csv.reader(fin)
+        writer = csv.writer(fout, lineterminator=os.linesep)
+        header = next(reader)
+        target = header.index(assignmentLabel)
+        positions = [header.index(column) for column in IDENTITY_COLUMNS if column in header] + [target]
+        writer.writerow([header[position] for position in positions])
+        exported = {}
+        rows = 0
+        for row in reader:
+            if not row:
+                continue
+            changed = True
+            if rows < grades.shape[0]:
+                login, value = logins[rows], values[rows]
+                if value is not None and not sameScore(row[target], value):
+                    row[target] = value
+                if login is not None:
+                    exported[login] = row[target]
+                    changed = previous is None or login not in previous or not sameScore(previous[login], row[target])
+            rows += 1
+            if changed:
+                writer.writerow([row[position] for position in positions])
+    if rows != grades.shape[0]:
+        raise ValueError('{} has {} rows but the gradebook has {}'.format(grade_csv, rows, grades.shape[0]))
+    return exported
+
+"""
+Text of the score of each student in the gradebook, by 'SIS Login ID', as exported by writeGradebook.
+"""
+def scoreTexts(grades: pd.DataFrame, assignmentLabel, scores: pd.DataFrame = None) -> dict[str, str]:
+    logins = grades['SIS Login ID'].to_numpy(dtype=object, na_value=None)
+    values = formatColumn(grades[assignmentLabel], missingScores(scores, assignmentLabel))
+    return {login: value for login, value in zip(logins, values) if login is not None and value is not None}
+
+"""
+Text of the score of each student in an exported CSV, by 'SIS Login ID', to be given as previous to writeDelta.
+"""
+def readExported(output_csv, assignmentLabel) -> dict[str, str]:
+    with open(output_csv, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        login, score = header.index('SIS Login ID'), header.index(assignmentLabel)
+        return {row[login]: row[score] for row in reader if len(row) > max(login, score) and row[login]}
+
+"""
+Rows of the gradebook without a score for the column in the scores returned by fillScores, None if they are not given.
+"""
+def missingScores(scores: pd.DataFrame, column) -> np.ndarray:
+    if scores is None or column not in scores:
+        return None
+    return scores[column].isna().to_numpy()
+
+"""
+Text of the values of one column in the output CSV, None for a blank cell.
+Scores are rounded to 2 decimal places, which also drops the rounding error of SCORE_DTYPE, e.g. 2.67 instead of 2.6700000762939453.
+The 0 received by the students of the missing rows, without a score in the gradesheets, is written as '0' to tell it from
+a score of 0.0.
+"""
+def formatColumn(values: pd.Series, missing: np.ndarray = None) -> list[str]:
+    if not pd.api.types.is_float_dtype(values):
+        return [None if pd.isna(value) else str(value) for value in values]
+    texts = [None if pd.isna(value) else repr(round(float(value), 2)) for value in values.to_numpy(dtype=object)]
+    if missing is not None:
+        for row in np.flatnonzero(missing & (values.to_numpy(dtype=float, na_value=np.nan) == 0)):
+            texts[row] = '0'
+    return texts
+
+"""
+Whether the text of a cell in the Canvas CSV is the same score as the formatted value, e.g. '3' and '3.0'.
+"""
+def sameScore(text: str, value: str) -> bool:
+    if text == value:
+        return True
+    try:
+        return round(float(text), 2) == float(value)
+    except ValueError:
+        return False
+
+"""
+Name of the assignment without the Canvas ID, e.g. 'Lab 2 (309931)' -> 'Lab 2'.
+"""
+def assignmentName(assignmentLabel) -> str:
+    if not assignmentLabel:
+        return None
+    return assignmentLabel.split(' (')[0]
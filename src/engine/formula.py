@@ -0,0 +1,164 @@
+"""
+Scoring formulas of assignment types, see engine.assignment.
+
+A formula is a Python expression over the columns of the imported sheets and the parameters of the type, e.g.
+    attendance.Attendance + zinc.Score / zincMax + (question['Question score'] if question['Lucky?'] == 'Yes' else zinc.Score / zincMax)
+Columns are written as input.column, or input['column'] for names that are not identifiers.
+The expression is checked and compiled once into a code object working on whole NumPy arrays: conditionals become
+numpy.where, 'and', 'or' and 'not' become logical operations and max/min become element-wise maximum/minimum,
+so a formula is evaluated for every student in a few array operations, without a loop over the rows.
+"""
+import ast
+import numpy as np
+
+# Functions available in formulas, applied element-wise
+FUNCTIONS = {
+    'max': np.maximum,
+    'min': np.minimum,
+    'abs': np.absolute,
+    'round': np.around,
+    'floor': np.floor,
+    'ceil': np.ceil,
+    'clip': np.clip,
+    'where': np.where,
+}
+
+_COMPARISONS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd) + _COMPARISONS
+
+# Logical operations of 'and', 'or' and 'not', which cannot be called by name in formulas
+_LOGICAL = {'_and': np.logical_and, '_or': np.logical_or, '_not': np.logical_not}
+
+class FormulaError(ValueError):
+    """
+    Raised when a formula is not a valid expression or uses something other than columns, parameters and FUNCTIONS.
+    """
+
+class Formula:
+    """
+    A compiled formula. columns maps the variable of each column used to its (input, column),
+    and parameters lists the parameters used.
+    """
+    def __init__(self, expression: str, parameters=()):
+        self.expression = expression
+        self.columns: dict[str, tuple[str, str]] = {}
+        self.parameters: set[str] = set()
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise FormulaError('Invalid formula "{}": {}'.format(expression, e.msg)) from e
+        tree = ast.fix_missing_locations(_Vectorize(self, set(parameters)).visit(tree))
+        self.code = compile(tree, '<formula>', 'eval')
+
+    """
+    Columns used from each input, in the order they appear in the formula.
+    """
+    def inputColumns(self) -> dict[str, list[str]]:
+        used = {}
+        for source, column in self.columns.values():
+            if column not in used.setdefault(source, []):
+                used[source].append(column)
+        return used
+
+    """
+    Evaluate the formula for n rows. values maps each (input, column) to an array of n values,
+    and parameters the name of each parameter to a number.
+    """
+    def evaluate(self, values: dict, parameters: dict, n: int) -> np.ndarray:
+        variables = {name: np.asarray(values[key]) for name, key in self.columns.items()}
+        variables.update({name: parameters[name] for name in self.parameters})
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = eval(self.code, {'__builtins__': {}, **FUNCTIONS, **_LOGICAL}, variables)
+        return np.broadcast_to(np.asarray(result, dtype=float), (n,))
+
+class _Vectorize(ast.NodeTransformer):
+    """
+    Checks every node of a formula and rewrites the ones NumPy arrays do not support directly.
+    """
+    def __init__(self, formula: Formula, parameters: set):
+        self.formula = formula
+        self.parameters = parameters
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Load) + _OPERATORS):
+            raise FormulaError('"{}" is not allowed in formula "{}"'.format(ast.unparse(node) if isinstance(node, ast.expr) else type(node).__name__,
+                                                                           self.formula.expression))
+        return super().generic_visit(node)
+
+    def call(self, function, args):
+        return ast.Call(func=ast.Name(id=function, ctx=ast.Load()), args=args, keywords=[])
+
+    def column(self, source, column):
+        key = (source, column)
+        for name, used in self.formula.columns.items():
+            if used == key:
+                return ast.Name(id=name, ctx=ast.Load())
+        name = '_column{}'.format(len(self.formula.columns))
+        self.formula.columns[name] = key
+        return ast.Name(id=name, ctx=ast.Load())
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, (int, float, str, bool)):
+            raise FormulaError('Constant {!r} is not allowed in formula "{}"'.format(node.value, self.formula.expression))
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.parameters:
+            raise FormulaError('Unknown parameter "{}" in formula "{}", columns are written as input.column'.format(node.id, self.formula.expression))
+        self.formula.parameters.add(node.id)
+        return node
+
+    def visit_Attribute(self, node):
+        if not isinstance(node.value, ast.Name):
+            raise FormulaError('Invalid column "{}" in formula "{}"'.format(ast.unparse(node), self.formula.expression))
+        return self.column(node.value.id, node.attr)
+
+    def visit_Subscript(self, node):
+        if not (isinstance(node.value, ast.Name) and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+            raise FormulaError('Invalid column "{}" in formula "{}"'.format(ast.unparse(node), self.formula.expression))
+        return self.column(node.value.id, node.slice.value)
+
+    def visit_IfExp(self, node):
+        return self.call('where', [self.visit(node.test), self.visit(node.body), self.visit(node.orelse)])
+
+    # Apply a function of two arrays from left to right, e.g. a and b and c is _and(_and(a, b), c)
+    def reduce(self, function, args):
+        result = args[0]
+        for arg in args[1:]:
+            result = self.call(function, [result, arg])
+        return result
+
+    def visit_BoolOp(self, node):
+        return self.reduce('_and' if isinstance(node.op, ast.And) else '_or', [self.visit(value) for value in node.values])
+
+    def visit_UnaryOp(self, node):
+        if isinstance(node.op, ast.Not):
+            return self.call('_not', [self.visit(node.operand)])
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        # a < b < c is (a < b) and (b < c), which arrays only support element-wise
+        operands = [self.visit(node.left)] + [self.visit(comparator) for comparator in node.comparators]
+        for op in node.ops:
+            if not isinstance(op, _COMPARISONS):
+                raise FormulaError('"{}" is not allowed in formula "{}"'.format(type(op).__name__, self.formula.expression))
+        return self.reduce('_and', [ast.Compare(left=left, ops=[op], comparators=[right])
+                                    for left, op, right in zip(operands, node.ops, operands[1:])])
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise FormulaError('Unknown function "{}" in formula "{}", expected one of {}'.format(
+                ast.unparse(node.func), self.formula.expression, list(FUNCTIONS)))
+        if node.keywords:
+            raise FormulaError('Keyword arguments are not allowed in formula "{}"'.format(self.formula.expression))
+        args = [self.visit(arg) for arg in node.args]
+        # max(a, b, c) is applied pairwise, as numpy.maximum takes two arrays
+        if node.func.id in ['max', 'min'] and len(args) > 2:
+            return self.reduce(node.func.id, args)
+        return self.call(node.func.id, args)
+
+"""
+Compile a formula, raising FormulaError if it is invalid. parameters are the names of the parameters it may use.
+"""
+def compileFormula(expression: str, parameters=()) -> Formula:
+    return Formula(expression, parameters)
@@ -0,0 +1,104 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import pandas as pd
+
+from engine.cache import readExcel
+
+# Default column names
+SID_COLUMN = 'SIS Login ID'
+TOT_COLUMN = 'Total'
+
+# Columns chosen for gradefiles without the default names, by template, can be overridden by an environment variable
+COLUMNS_FILE = os.environ.get('GRADEPARSER_COLUMNS', str(Path.home() / '.config' / 'gradeparser' / 'hw_columns.json'))
+
+"""
+Column names of the first sheet of a gradefile, reading only its header row.
+"""
+def probeHeader(report_xlsx) -> list[str]:
+    return [str(column) for column in readExcel(report_xlsx, sheet_name=0, nrows=0).columns]
+
+"""
+Fingerprint of a gradefile template: the hash of its column names in order.
+Gradefiles made from the same template share it, whatever their rows.
+"""
+def templateFingerprint(columns) -> str:
+    return hashlib.sha256(json.dumps(list(columns)).encode()).hexdigest()
+
+"""
+Remembered columns of every template, by fingerprint. Empty if the file is missing or unreadable.
+"""
+def rememberedColumns() -> dict[str, dict]:
+    try:
+        with open(COLUMNS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+"""
+Remember the columns chosen for a template. Failing to write the file only loses the mapping.
+"""
+def rememberColumns(fingerprint, columns: dict):
+    mappings = rememberedColumns()
+    mappings[fingerprint] = columns
+    path = Path(COLUMNS_FILE)
+    temp = path.with_suffix('.{}.tmp'.format(os.getpid()))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp.write_text(json.dumps(mappings, indent=2))
+        os.replace(temp, path)
+    except OSError:
+        temp.unlink(missing_ok=True)
+
+"""
+Find the ITSC email and total score columns of a gradefile header, as {SID_COLUMN: name, TOT_COLUMN: name}.
+Columns given explicitly are used as is. Otherwise the default names are used if present, then the columns remembered
+for the template of the header, and askColumn(title, prompt, columns) is called for the rest.
+Every column not under its default name, given or asked, is remembered for the template, so later runs need neither.
+"""
+def resolveColumns(header: list[str], report_xlsx, askColumn=None, columns: dict = None) -> dict:
+    columns = columns or {}
+    resolved = {SID_COLUMN: SID_COLUMN, TOT_COLUMN: TOT_COLUMN, **columns}
+    for column in columns.values():
+        if column not in header:
+            raise KeyError('Column "{}" not found in {}'.format(column, report_xlsx))
+
+    fingerprint = templateFingerprint(header)
+    remembered = rememberedColumns().get(fingerprint, {})
+    prompts = {SID_COLUMN: ('ITSC email column', 'Select the column containing ITSC emails:'),
+               TOT_COLUMN: ('Total score column', 'Select the column containing total scores:')}
+    for key, column in resolved.items():
+        if column in header:
+            continue
+        if remembered.get(key) in header:
+            resolved[key] = remembered[key]
+            continue
+        if askColumn is None:
+            raise KeyError('Column "{}" not found in {}'.format(column, report_xlsx))
+        resolved[key] = askColumn(*prompts[key], header)
+        if resolved[key] not in header:
+            raise KeyError('{} not selected for {}'.format(prompts[key][0], report_xlsx))
+
+    mapping = {**remembered, **{key: column for key, column in resolved.items() if column != key}}
+    if mapping != remembered:
+        rememberColumns(fingerprint, mapping)
+    return resolved
+
+"""
+Process homework gradefile.
+Accepts a single Excel file, which should contain one column with ITSC emails, and another column with the total score.
+Only the header row is read to find these columns, see resolveColumns, then only these 2 columns are parsed.
+columns optionally gives their names, as {SID_COLUMN: name, TOT_COLUMN: name}.
+
+The total scores are stored, without being scaled, in a column named after the assignment.
+"""
+def parseHWreport(report_xlsx, assignmentLabel, askColumn=None, columns: dict = None) -> pd.DataFrame:
+    header = probeHeader(report_xlsx)
+    resolved = resolveColumns(header, report_xlsx, askColumn, columns)
+    report = readExcel(report_xlsx, sheet_name=0, usecols=list(dict.fromkeys(resolved.values())))
+    report = pd.DataFrame({key: report[column] for key, column in resolved.items()})
+
+    report.dropna(subset=[SID_COLUMN], inplace=True)
+    report[assignmentLabel] = report[TOT_COLUMN]
+    return report
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import openpyxl
+
+from engine.cache import iterExcels, readCached, storeCached
+from engine.canvas import SCORE_DTYPE
+
+from engine.zinc import readZINCreports, DEFAULT_POLICY
+
+# Columns of the question score sheets used by processLabScores
+QUESTION_COLUMNS = ['Email', 'Lucky?', 'Question score']
+
+# Columns of each component used by processLabScores, compared by changedStudents
+ATTENDANCE_COLUMNS = ['Attendance']
+ZINC_COLUMNS = ['ZINC']
+
+"""
+Process attendance sheet.
+Supports multiple Excel files, though only one should be needed under current arrangement.
+The Excel file(s) should contain 1 sheet named 'Tally', containing Email, Name and Score columns.
+The first row of each Email is kept. The files are read one at a time, keeping only the rows of new Emails from each.
+"""
+def parseLabAttendance(attendance_xlsxs, progress=None) -> pd.DataFrame:
+    attendances = []
+    seen = pd.Index([])
+    for attendance in iterExcels(attendance_xlsxs, sheet_name='Tally', progress=progress):
+        attendance = attendance.loc[~attendance['Email'].isin(seen)].drop_duplicates(subset=['Email'])
+        attendances.append(attendance)
+        seen = seen.append(pd.Index(attendance['Email']))
+    return pd.concat(attendances)
+
+"""
+Process ZINC reports.
+Supports multiple Excel files, downloaded from ZINC. Each lab session has one submission module for different due dates.
+Duplicate ITSCs are resolved by the policy and the optional review, see engine.zinc.resolveDuplicates.
+
+Automatically generates Email column for compatibility, and scale the ZINC score based on the maximum score.
+"""
+def parseLabZINCreports(zinc_xlsxs, zincMax=100, policy=DEFAULT_POLICY, preferFile=None, review=None, progress=None) -> pd.DataFrame:
+    zinc = readZINCreports(zinc_xlsxs, policy, preferFile, review, progress)
+    zinc['Email'] = zinc['ITSC'] + '@connect.ust.hk'
+    zinc['ZINC'] = zinc['Score'].div(zincMax)
+    return zinc
+
+"""
+Process question score sheet.
+Accepts a single Excel file with the first N sheets containing question score for each lab session, N for number of lab sessions.
+Each sheet should contain Email, 'Lucky?' and 'Question score' columns, the other columns are not read.
+"""
+def parseLabQuestions(question_xlsx, numLabs) -> pd.DataFrame:
+    sheets = tuple(range(numLabs))
+    question = readCached(question_xlsx, sheets, usecols=QUESTION_COLUMNS)
+    if question is None:
+        question = pd.concat(readQuestionSheets(question_xlsx, numLabs))
+        storeCached(question, question_xlsx, sheets, usecols=QUESTION_COLUMNS)
+    question.drop_duplicates(subset=['Email'], inplace=True)
+    return question
+
+"""
+Read the first N sheets of the question score workbook, opening it only once in read-only mode.
+Yields one DataFrame per sheet with only the QUESTION_COLUMNS, so the rest of each sheet is never kept in memory.
+"""
+def readQuestionSheets(question_xlsx, numLabs, columns=QUESTION_COLUMNS):
+    workbook = openpyxl.load_workbook(question_xlsx, read_only=True, data_only=True)
+    try:
+        if len(workbook.worksheets) < numLabs:
+            raise ValueError('{} has {} sheets, expected at least {}'.format(question_xlsx, len(workbook.worksheets), numLabs))
+        for worksheet in workbook.worksheets[:numLabs]:
+            rows = worksheet.iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            missing = [column for column in columns if column not in header]
+            if missing:
+                raise KeyError('Columns {} not found in sheet "{}" of {}'.format(missing, worksheet.title, question_xlsx))
+            positions = [header.index(column) for column in columns]
+            values = [[row[i] if i < len(row) else None for i in positions] for row in rows]
+            sheet = pd.DataFrame(values, columns=columns).dropna(how='all')
+            sheet['Question score'] = pd.to_numeric(sheet['Question score'], errors='coerce')
+            yield sheet
+    finally:
+        workbook.close()
+
+"""
+Calculate lab scores when all 3 components have been imported.
+Formula: Attendance + ZINC + (Question if Lucky else ZINC)
+The total is stored in a column named after the assignment, keyed by 'SIS Login ID'.
+"""
+def processLabScores(attendance, question, zinc, assignmentLabel) -> pd.DataFrame:
+    report = attendance.merge(question.loc[:, ['Email', 'Lucky?', 'Question score']], how='left', on='Email')
+    report = report.merge(zinc.loc[:, ['Email', 'ZINC']], how='left', on='Email')
+    report['Question score'] = report['Question score'].fillna(0)
+    report['ZINC'] = report['ZINC'].fillna(0)
+    report['Total'] = report['Attendance'] + report['ZINC'] + np.where(report['Lucky?'] == 'Yes', report['Question score'], report['ZINC'])
+    report['Total'] = report['Total'].round(2).astype(SCORE_DTYPE)
+    report.rename(columns={'Email': 'SIS Login ID', 'Total': assignmentLabel}, inplace=True)
+    return report
+
+"""
+Emails of the students whose rows differ between two imports of a component, including added and removed students.
+Only the given columns are compared, e.g. ZINC_COLUMNS for the ZINC reports.
+"""
+def changedStudents(old: pd.DataFrame, new: pd.DataFrame, columns) -> pd.Index:
+    columns = [column for column in columns if column != 'Email']
+    old = old.drop_duplicates(subset=['Email']).set_index('Email')[columns]
+    new = new.drop_duplicates(subset=['Email']).set_index('Email')[columns]
+    emails = old.index.union(new.index)
+    old = old.reindex(emails)
+    new = new.reindex(emails)
+    same = (old == new) | (old.isna() & new.isna())
+    return emails[~same.all(axis=1)]
+
+"""
+Recalculate the lab scores of the given students only, returning the report with their rows replaced.
+Falls back to processLabScores if the attendance lists other students than the report.
+"""
+def updateLabScores(report, attendance, question, zinc, assignmentLabel, students) -> pd.DataFrame:
+    if not pd.Index(attendance['Email']).drop_duplicates().sort_values().equals(pd.Index(report['SIS Login ID']).sort_values()):
+        return processLabScores(attendance, question, zinc, assignmentLabel)
+
+    # processLabScores keeps the order of the attendance, so the patched rows line up with the rows of the report
+    patch = processLabScores(attendance.loc[attendance['Email'].isin(students)],
+                             question.loc[question['Email'].isin(students)],
+                             zinc.loc[zinc['Email'].isin(students)], assignmentLabel)
+    report = report.copy()
+    rows = report['SIS Login ID'].isin(students).to_numpy()
+    for column in patch.columns:
+        report.loc[rows, column] = patch[column].to_numpy()
+    return report
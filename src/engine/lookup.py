@@ -0,0 +1,141 @@
+"""
+Per-student lookup store, answering "what did student X get in every PA" without loading any CSV.
+
+The store is a SQLite database holding every assignment processed in the term, with indexes on the ITSC,
+'SIS User ID' and name of the students. Each score row keeps the per-test-case results as a JSON array,
+in the order of the test case names stored once per assignment.
+Only the standard library is used, so queries do not import pandas.
+"""
+from pathlib import Path
+from datetime import datetime
+import json
+import math
+import os
+import sqlite3
+
+# Location of the store, can be overridden by an environment variable
+LOOKUP_DB = os.environ.get('GRADEPARSER_LOOKUP', str(Path.home() / '.local' / 'share' / 'gradeparser' / 'lookup.db'))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS assignments (
+    assignment TEXT PRIMARY KEY,
+    testcases TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS students (
+    login TEXT PRIMARY KEY,
+    itsc TEXT NOT NULL,
+    sis_user_id INTEGER,
+    name TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS students_itsc ON students (itsc);
+CREATE INDEX IF NOT EXISTS students_sis_user_id ON students (sis_user_id);
+CREATE INDEX IF NOT EXISTS students_name ON students (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS scores (
+    assignment TEXT NOT NULL,
+    login TEXT NOT NULL,
+    score REAL,
+    penalty REAL,
+    total REAL,
+    remarks TEXT,
+    results TEXT,
+    PRIMARY KEY (assignment, login)
+);
+CREATE INDEX IF NOT EXISTS scores_login ON scores (login);
+'''
+
+"""
+Open the store, creating it and its tables if needed.
+"""
+def connect(db_path=None) -> sqlite3.Connection:
+    db_path = Path(db_path or LOOKUP_DB)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+"""
+Number, or None for a missing value.
+If digits is given, the number is rounded, e.g. to drop the rounding error of float32 scores.
+"""
+def _number(value, digits=None):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value):
+        return None
+    return value if digits is None else round(value, digits)
+
+"""
+Store the scores of one assignment, replacing the rows stored when it was processed before.
+
+lookup has one row per student with the columns 'Student', 'SIS User ID', 'SIS Login ID', 'Score', 'Penalty',
+'Total' and 'Remarks', as written to lookup/score.csv. If the deduplicated ZINC DataFrame is given, the results of
+its test case columns, i.e. the columns after 'Late Submission', are stored for each ITSC.
+Returns the number of stored scores.
+"""
+def storeScores(assignmentLabel, lookup, zinc=None, db_path=None) -> int:
+    testcases = []
+    results = {}
+    if zinc is not None:
+        testcases = [str(column) for column in zinc.columns[4:]]
+        for itsc, row in zip(zinc['ITSC'].tolist(), zinc.iloc[:, 4:].to_numpy(dtype=float, na_value=math.nan).tolist()):
+            results[itsc] = json.dumps([None if math.isnan(value) else value for value in row])
+
+    logins = lookup['SIS Login ID'].tolist()
+    itscs = [str(login).split('@')[0] for login in logins]
+    sisUserIds = [None if _number(value) is None else int(_number(value)) for value in lookup['SIS User ID'].tolist()]
+    students = list(zip(logins, itscs, sisUserIds, lookup['Student'].tolist()))
+    scores = [(assignmentLabel, login, _number(score), _number(penalty), _number(total, 2), remarks or None, results.get(itsc))
+              for login, itsc, score, penalty, total, remarks in zip(logins, itscs, lookup['Score'].tolist(), lookup['Penalty'].tolist(),
+                                                                     lookup['Total'].tolist(), lookup['Remarks'].tolist())]
+
+    connection = connect(db_path)
+    try:
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO assignments VALUES (?, ?, ?)',
+                               (assignmentLabel, json.dumps(testcases), datetime.now().isoformat(timespec='seconds')))
+            connection.executemany('INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?)', students)
+            connection.execute('DELETE FROM scores WHERE assignment = ?', (assignmentLabel,))
+            connection.executemany('INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?, ?)', scores)
+    finally:
+        connection.close()
+    return len(scores)
+
+"""
+Students matching the query: an exact ITSC, 'SIS Login ID' or 'SIS User ID', otherwise a name starting with it.
+Returns a list of (login, itsc, SIS User ID, name).
+"""
+def findStudents(query, db_path=None) -> list[tuple]:
+    query = str(query).strip()
+    connection = connect(db_path)
+    try:
+        students = connection.execute('SELECT login, itsc, sis_user_id, name FROM students WHERE itsc = ? OR login = ? OR sis_user_id = ?',
+                                      (query.split('@')[0] if query.endswith('@connect.ust.hk') else query, query,
+                                       int(query) if query.isdigit() else None)).fetchall()
+        if not students:
+            # The name index serves prefix matches, as names are stored with NOCASE collation
+            pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            students = connection.execute("SELECT login, itsc, sis_user_id, name FROM students WHERE name LIKE ? ESCAPE '\\' ORDER BY name",
+                                          (pattern,)).fetchall()
+        return students
+    finally:
+        connection.close()
+
+"""
+Every stored score of one student, in the order the assignments were processed.
+Each score is a dict with the assignment, score, penalty, total, remarks and the results of each test case.
+"""
+def studentScores(login, db_path=None) -> list[dict]:
+    connection = connect(db_path)
+    try:
+        rows = connection.execute('''
+            SELECT scores.assignment, score, penalty, total, remarks, results, testcases
+            FROM scores JOIN assignments ON assignments.assignment = scores.assignment
+            WHERE login = ? ORDER BY updated, scores.assignment''', (login,)).fetchall()
+    finally:
+        connection.close()
+    return [{'assignment': assignment, 'score': score, 'penalty': penalty, 'total': total, 'remarks': remarks,
+             'testcases': dict(zip(json.loads(testcases), json.loads(results))) if results else {}}
+            for assignment, score, penalty, total, remarks, results, testcases in rows]
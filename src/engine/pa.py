@@ -0,0 +1,32 @@
+import pandas as pd
+
+from engine.canvas import SCORE_DTYPE
+from engine.zinc import readZINCreports, DEFAULT_POLICY
+
+"""
+Process ZINC report.
+Supports multiple Excel files, downloaded from ZINC.
+Typically only 1 file is needed, but in some cases there are multiple ZINC submission modules with different deadlines.
+Duplicate ITSCs are resolved by the policy and the optional review, see engine.zinc.resolveDuplicates.
+
+Automatically calculates total PA score using the formula: Total = max(ZINC / zincMax - Penalty, 0) where:
+- Penalty is the number of late minutes, rounded down
+- zincMax is the maximum ZINC score
+
+Returns the deduplicated ZINC DataFrame and the report, with the total stored in a column named after the assignment.
+"""
+def parsePAreport(zinc_xlsxs, assignmentLabel, zincMax=100, policy=DEFAULT_POLICY, preferFile=None, review=None, progress=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    zinc = readZINCreports(zinc_xlsxs, policy, preferFile, review, progress)
+    return zinc, scorePAreport(zinc, assignmentLabel, zincMax)
+
+"""
+Calculate the PA scores of the deduplicated ZINC DataFrame, see parsePAreport.
+"""
+def scorePAreport(zinc: pd.DataFrame, assignmentLabel, zincMax=100) -> pd.DataFrame:
+    report = zinc.loc[:,['ITSC', 'Name', 'Score', 'Late Submission']]
+    report['Penalty'] = pd.to_numeric(report['Late Submission'].fillna('0.').str.split('.').str.get(0))
+    report['Total'] = (report['Score'] / zincMax * 100 - report['Penalty']).clip(lower=0)
+    report['Total'] = report['Total'].round(2).astype(SCORE_DTYPE)
+    report['SIS Login ID'] = report['ITSC'] + '@connect.ust.hk'
+    report.rename(columns={'Total': assignmentLabel}, inplace=True)
+    return report
@@ -0,0 +1,11 @@
+"""
+Policies to pick one row when an ITSC appears in several ZINC reports, see engine.zinc.chooseRows.
+Kept apart from engine.zinc so the apps can use them without importing pandas.
+"""
+POLICY_FIRST = 'first'
+POLICY_LATEST = 'latest'
+POLICY_HIGHEST = 'highest'
+POLICY_LEAST_LATE = 'least-late'
+POLICY_FILE = 'file'
+POLICIES = [POLICY_LATEST, POLICY_FIRST, POLICY_HIGHEST, POLICY_LEAST_LATE, POLICY_FILE]
+DEFAULT_POLICY = POLICY_LATEST
@@ -0,0 +1,88 @@
+"""
+Persistent sessions, so closing the app does not lose the imported gradesheets and computed scores.
+
+A session belongs to one kind of app and one Canvas assignment. The Canvas ID in the assignment label is unique
+to a course and term, so each session directory holds the work on one assignment of one course in one term.
+It contains a manifest with the plain state, such as the duplicate policy and the hash of the Canvas CSV,
+and one pickle per DataFrame, named by the manifest, which restores with its dtypes and index without parsing anything.
+"""
+from pathlib import Path
+from datetime import datetime
+import json
+import os
+import re
+import shutil
+import pandas as pd
+
+# Location of the sessions, can be overridden by an environment variable
+SESSION_DIR = os.environ.get('GRADEPARSER_SESSIONS', str(Path.home() / '.local' / 'share' / 'gradeparser' / 'sessions'))
+
+MANIFEST = 'manifest.json'
+
+"""
+Directory of the session of one app kind, e.g. 'lab', and one assignment.
+"""
+def sessionPath(kind, assignmentLabel) -> Path:
+    return Path(SESSION_DIR) / re.sub(r'[^\w.-]+', '_', '{}-{}'.format(kind, assignmentLabel)).strip('_')
+
+"""
+Save the state and DataFrames of a session, replacing the saved ones.
+state must be JSON serializable. Frames that are None are removed from the session.
+The frames are written to new files, named after the save, and the manifest pointing to them is replaced last.
+A save interrupted before that keeps the previous session whole; the files of earlier saves are removed after it.
+"""
+def saveSession(kind, assignmentLabel, state: dict, frames: dict):
+    path = sessionPath(kind, assignmentLabel)
+    path.mkdir(parents=True, exist_ok=True)
+    version = '{}-{}'.format(datetime.now().strftime('%Y%m%d%H%M%S%f'), os.getpid())
+    saved = {}
+    for name, frame in frames.items():
+        if frame is None:
+            continue
+        saved[name] = '{}.{}.pkl'.format(name, version)
+        frame.to_pickle(path / saved[name])
+
+    manifest = {'kind': kind, 'assignment': assignmentLabel, 'saved': datetime.now().isoformat(timespec='seconds'),
+                'frames': saved, 'state': state}
+    temp = path / '{}.{}.tmp'.format(MANIFEST, os.getpid())
+    temp.write_text(json.dumps(manifest, indent=2))
+    os.replace(temp, path / MANIFEST)
+
+    for entry in path.glob('*.pkl'):
+        if entry.name not in saved.values():
+            entry.unlink(missing_ok=True)
+
+"""
+Manifest of a saved session: its kind, assignment, time of saving, frame files and state. None if there is none.
+"""
+def sessionManifest(kind, assignmentLabel) -> dict:
+    try:
+        return json.loads((sessionPath(kind, assignmentLabel) / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return None
+
+"""
+Load a saved session, returning its state and the DataFrames of the manifest, or (None, {}) if there is none.
+Only the given frames are read if names is given. If a save replaces the session meanwhile, the new one is read.
+"""
+def loadSession(kind, assignmentLabel, names=None) -> tuple[dict, dict]:
+    path = sessionPath(kind, assignmentLabel)
+    while True:
+        manifest = sessionManifest(kind, assignmentLabel)
+        if manifest is None:
+            return None, {}
+        files = manifest['frames']
+        if isinstance(files, list):
+            # Sessions saved before the frame files were versioned
+            files = {name: '{}.pkl'.format(name) for name in files}
+        try:
+            return manifest['state'], {name: pd.read_pickle(path / file) for name, file in files.items() if names is None or name in names}
+        except FileNotFoundError:
+            if sessionManifest(kind, assignmentLabel) == manifest:
+                raise
+
+"""
+Remove a saved session.
+"""
+def deleteSession(kind, assignmentLabel):
+    shutil.rmtree(sessionPath(kind, assignmentLabel), ignore_errors=True)
@@ -0,0 +1,229 @@
+"""
+Offline code similarity of C++ submissions, used in place of JPlag.
+
+Each submission is tokenized with identifiers, literals and comments normalized away, so renaming variables
+or reformatting does not hide copied code. The hashes of its k-grams of tokens are winnowed into a small set of
+fingerprints, and an inverted index from fingerprint to submissions gives the candidate pairs directly,
+instead of comparing every pair of submissions. Fingerprints of the skeleton code and fingerprints shared by many
+submissions, e.g. boilerplate, are ignored.
+
+Fingerprinting and pair counting run on a process pool, and the fingerprints of each submission are cached by the
+hash of its files, next to the parsed sheets of engine.cache and within its size limit, so rerunning after late
+submissions only fingerprints the new ones.
+"""
+from pathlib import Path
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import hashlib
+import os
+import re
+import zlib
+import pandas as pd
+
+from engine.cache import readBytes, storeBytes, evict
+from engine.trace import stage
+
+# Files of a submission that are compared
+SOURCE_SUFFIXES = {'.cpp', '.cc', '.cxx', '.c', '.h', '.hpp', '.hxx'}
+
+# Length of the k-grams of tokens and of the winnowing window: any match of at least K + WINDOW - 1 tokens is found
+K = 12
+WINDOW = 8
+
+# Fingerprints in more than max(COMMON_MIN, COMMON_SHARE * submissions) submissions are treated as boilerplate
+COMMON_MIN = 10
+COMMON_SHARE = 0.1
+
+# Pairs sharing less than this fraction of the fingerprints of the smaller submission, or fewer fingerprints than
+# MIN_SHARED (about a dozen lines of code), are not reported
+MIN_SIMILARITY = 0.2
+MIN_SHARED = 20
+
+# Pairs are ranked by similarity in bands of this width, and by the number of shared fingerprints within a band,
+# so a long copy with a few edits ranks above two short submissions that happen to match
+SIMILARITY_BAND = 0.1
+
+# Below this number of index entries the pairs are counted in this process
+PARALLEL_POSTINGS = 20000
+
+# Bumped whenever the tokenizer or hashing changes, so old cache entries are not used
+FINGERPRINT_VERSION = 1
+
+CPP_KEYWORDS = set('''
+    alignas alignof and and_eq asm auto bitand bitor bool break case catch char char16_t char32_t char8_t class compl
+    concept const const_cast consteval constexpr constinit continue co_await co_return co_yield decltype default delete
+    do double dynamic_cast else enum explicit export extern false float for friend goto if inline int long mutable
+    namespace new noexcept not not_eq nullptr operator or or_eq private protected public register reinterpret_cast
+    requires return short signed sizeof static static_assert static_cast struct switch template this thread_local throw
+    true try typedef typeid typename union unsigned using virtual void volatile wchar_t while xor xor_eq
+'''.split())
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<preprocessor>^[ \t]*\#(?:\\\n|[^\n])*)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<number>\.?\d(?:[eEpP][+-]|[\w.'])*)
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<operator>::|->\*?|\.\*|\+\+|--|<<=?|>>=?|<=>|&&|\|\||\.\.\.|[<>=!+\-*/%&|^]=|[{}()\[\];,.?:~!+\-*/%&|^=<>])
+''', re.S | re.M | re.X)
+
+"""
+Normalized tokens of C++ source: keywords and operators are kept, identifiers become 'I', string and character
+literals 'S' and numbers 'N'. Comments and preprocessor lines such as #include are dropped.
+"""
+def tokenize(source: str) -> list[str]:
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        if kind == 'word':
+            word = match.group()
+            tokens.append(word if word in CPP_KEYWORDS else 'I')
+        elif kind == 'operator':
+            tokens.append(match.group())
+        elif kind == 'string':
+            tokens.append('S')
+        elif kind == 'number':
+            tokens.append('N')
+    return tokens
+
+"""
+Winnowed fingerprints of a token list: the smallest hash of every window of WINDOW consecutive k-gram hashes.
+"""
+def fingerprint(tokens: list[str], k=K, window=WINDOW) -> set[int]:
+    text = [token.encode() for token in tokens]
+    hashes = [zlib.crc32(b'\x00'.join(text[i:i + k])) for i in range(len(text) - k + 1)]
+    if len(hashes) <= window:
+        return set(hashes)
+    return {min(hashes[i:i + window]) for i in range(len(hashes) - window + 1)}
+
+"""
+Source files of a submission, which is either a single file or a directory searched recursively.
+"""
+def sourceFiles(submission) -> list[Path]:
+    submission = Path(submission)
+    if submission.is_file():
+        return [submission]
+    return sorted(path for path in submission.rglob('*') if path.is_file() and path.suffix.lower() in SOURCE_SUFFIXES)
+
+"""
+Fingerprints of one submission, through the cache keyed by the hash of its files and the fingerprint parameters.
+"""
+def submissionFingerprints(submission, k=K, window=WINDOW) -> array:
+    files = sourceFiles(submission)
+    sources = [path.read_bytes() for path in files]
+    digest = hashlib.sha256('{}|{}|{}'.format(FINGERPRINT_VERSION, k, window).encode())
+    for path, source in zip(files, sources):
+        digest.update(path.name.encode())
+        digest.update(hashlib.sha256(source).digest())
+    key = 'fingerprints-' + digest.hexdigest()
+
+    cached = readBytes(key)
+    if cached is not None:
+        fingerprints = array('I')
+        fingerprints.frombytes(cached)
+        return fingerprints
+
+    tokens = []
+    for source in sources:
+        tokens.extend(tokenize(source.decode('utf-8', errors='replace')))
+    fingerprints = array('I', sorted(fingerprint(tokens, k, window)))
+    storeBytes(fingerprints.tobytes(), key)
+    return fingerprints
+
+"""
+Number of shared fingerprints of every pair of submissions in the postings of an inverted index.
+Pairs are keyed by (i, j) with i < j.
+"""
+def countPairs(postings: list[list[int]]) -> Counter:
+    pairs = Counter()
+    for submissions in postings:
+        for a in range(len(submissions)):
+            for b in range(a + 1, len(submissions)):
+                pairs[submissions[a], submissions[b]] += 1
+    return pairs
+
+"""
+Submissions in a directory, one per student: each subdirectory or source file directly inside it.
+Returns the student names, taken from the directory or file names, and the paths.
+"""
+def listSubmissions(submissions_dir) -> tuple[list[str], list[Path]]:
+    paths = sorted(path for path in Path(submissions_dir).iterdir()
+                   if path.is_dir() or path.suffix.lower() in SOURCE_SUFFIXES)
+    return [path.stem if path.is_file() else path.name for path in paths], paths
+
+"""
+Rank the pairs of submissions of a directory by similarity, see listSubmissions for the layout.
+If the skeleton code given to the students is given as base, its fingerprints are ignored.
+
+Returns one row per pair sharing at least minSimilarity of the fingerprints of the smaller submission and at least
+minShared fingerprints, with the columns 'Student A', 'Student B', 'Similarity', 'Jaccard' and 'Shared', most similar
+first, see SIMILARITY_BAND.
+progress(done, total) is called while the submissions are fingerprinted.
+"""
+def rankSimilarity(submissions_dir, base=None, minSimilarity=MIN_SIMILARITY, minShared=MIN_SHARED, workers=None, progress=None, k=K, window=WINDOW) -> pd.DataFrame:
+    names, paths = listSubmissions(submissions_dir)
+    total = len(paths)
+    workers = workers or os.cpu_count()
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        with stage('Fingerprint submissions') as s:
+            fingerprints = []
+            for prints in executor.map(partial(submissionFingerprints, k=k, window=window), paths, chunksize=max(1, total // (4 * workers))):
+                fingerprints.append(prints)
+                if progress is not None:
+                    progress(len(fingerprints), total)
+            s.rows = total
+
+        with stage('Index fingerprints') as s:
+            ignored = set(submissionFingerprints(base, k, window)) if base else set()
+            # The fingerprints are stored without evicting, so the cache is trimmed once they are all stored
+            evict()
+            index = {}
+            for i, prints in enumerate(fingerprints):
+                for value in prints:
+                    if value not in ignored:
+                        index.setdefault(value, []).append(i)
+            # Fingerprints shared by too many submissions are boilerplate, and count towards nobody's size
+            common = max(COMMON_MIN, int(COMMON_SHARE * total))
+            postings = [submissions for submissions in index.values() if len(submissions) <= common]
+            sizes = [0] * total
+            for submissions in postings:
+                for i in submissions:
+                    sizes[i] += 1
+            postings = [submissions for submissions in postings if len(submissions) > 1]
+            s.rows = len(index)
+
+        with stage('Count shared fingerprints') as s:
+            if sum(map(len, postings)) < PARALLEL_POSTINGS:
+                pairs = countPairs(postings)
+            else:
+                pairs = Counter()
+                for counted in executor.map(countPairs, [postings[i::workers] for i in range(workers)]):
+                    pairs.update(counted)
+            s.rows = len(pairs)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    rows = []
+    for (a, b), shared in pairs.items():
+        similarity = shared / max(min(sizes[a], sizes[b]), 1)
+        if similarity >= minSimilarity and shared >= minShared:
+            rows.append((names[a], names[b], similarity, shared / (sizes[a] + sizes[b] - shared), shared))
+    ranked = pd.DataFrame(rows, columns=['Student A', 'Student B', 'Similarity', 'Jaccard', 'Shared'])
+    # A similarity of 1 falls in the top band, with the pairs just below it
+    band = (ranked['Similarity'] / SIMILARITY_BAND + 1e-9).floordiv(1).clip(upper=round(1 / SIMILARITY_BAND) - 1)
+    order = ranked.assign(Band=band).sort_values(['Band', 'Shared', 'Similarity'], ascending=False).index
+    return ranked.loc[order].reset_index(drop=True)
+
+"""
+Write the ranked pairs as a CSV report, with the similarities in percent.
+"""
+def writeSimilarity(ranked: pd.DataFrame, output_csv):
+    report = ranked.copy()
+    report['Similarity'] = (report['Similarity'] * 100).round(1)
+    report['Jaccard'] = (report['Jaccard'] * 100).round(1)
+    report.index = pd.RangeIndex(1, report.shape[0] + 1, name='Rank')
+    report.to_csv(output_csv)
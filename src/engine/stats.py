@@ -0,0 +1,103 @@
+"""
+Score and test case statistics of PA reports.
+Every statistic is computed with NumPy on plain float arrays, so reports with hundreds of test case columns
+are handled in one pass over the matrix of test case results.
+"""
+import numpy as np
+import pandas as pd
+
+# Score ranges of the histogram
+HISTOGRAM_BINS = np.arange(0, 101, 10)
+
+# Quantiles reported by scoreStats, with their names
+QUANTILES = {'Median': 0.5}
+
+"""
+Scores as a float array without the missing values, e.g. of students without a submission.
+"""
+def scoreValues(scores) -> np.ndarray:
+    values = pd.to_numeric(pd.Series(scores), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return values[~np.isnan(values)]
+
+"""
+Mean, SD, max, median and min of the scores, in the order they are reported.
+The SD is the sample standard deviation, as pandas computes it.
+"""
+def scoreStats(scores) -> dict:
+    values = scoreValues(scores)
+    if values.shape[0] == 0:
+        return {'Mean': np.nan, 'SD': np.nan, 'Max': np.nan, **{name: np.nan for name in QUANTILES}, 'Min': np.nan}
+    quantiles = np.quantile(values, list(QUANTILES.values()))
+    return {
+        'Mean': values.mean(),
+        'SD': values.std(ddof=1) if values.shape[0] > 1 else np.nan,
+        'Max': values.max(),
+        **dict(zip(QUANTILES, quantiles)),
+        'Min': values.min(),
+    }
+
+"""
+Number of scores in each range of the bins, and the bin edges.
+"""
+def scoreHistogram(scores, bins=HISTOGRAM_BINS) -> tuple[np.ndarray, np.ndarray]:
+    return np.histogram(scoreValues(scores), bins=bins)
+
+"""
+Pass percentage of each test case, i.e. the columns after 'Late Submission', with a bar to visualize it.
+The pass percentage is the sum of the results over the number of submissions and the full mark of the test case.
+"""
+def testcaseStats(zinc: pd.DataFrame) -> pd.DataFrame:
+    columns = zinc.columns[4:]
+    try:
+        results = zinc.iloc[:, 4:].to_numpy(dtype=float)
+    except (TypeError, ValueError):
+        # Nullable or text columns, text such as an error message counts as not passed
+        results = zinc.iloc[:, 4:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    # Missing results count as not passed
+    missing = np.isnan(results)
+    if missing.any():
+        results = np.where(missing, 0, results)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        full = results.max(axis=0) if results.shape[0] else np.full(len(columns), np.nan)
+        passPercentage = results.sum(axis=0) / zinc.shape[0] / full
+    stats = pd.DataFrame({'Pass percentage': pd.array(passPercentage, dtype='Float64')}, index=columns)
+    stats['Visualization'] = passBars(stats['Pass percentage'])
+    return stats
+
+"""
+ASCII bars of the pass percentage of each test case, e.g. '[====      ]'.
+A bar has one '=' for every step of 1/width below the percentage.
+"""
+def passBars(passPercentage: pd.Series, width=40) -> pd.Series:
+    filled = (np.arange(width) / width < passPercentage.to_numpy(dtype=float, na_value=np.nan)[:, None]).sum(axis=1)
+    bars = np.char.add(np.char.multiply('=', filled), np.char.multiply(' ', width - filled))
+    return '[' + pd.Series(bars, index=passPercentage.index, dtype=object) + ']'
+
+"""
+Write the score statistics followed by the pass percentage of each test case.
+"""
+def writeStats(stats_txt, scores, zinc: pd.DataFrame):
+    with open(stats_txt, mode='w') as sf:
+        for name, value in scoreStats(scores).items():
+            print('{}: {:.2f}'.format(name, value), file=sf)
+        print(file=sf)
+        print(testcaseStats(zinc).to_string(), file=sf)
+
+"""
+Render the histogram of the scores to a PNG file.
+The figure is drawn with the non-interactive Agg backend and without pyplot, so it can be rendered from any thread.
+"""
+def renderHistogram(output_png, scores, title, bins=HISTOGRAM_BINS):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    counts, edges = scoreHistogram(scores, bins)
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    widths = np.diff(edges)
+    ax.bar(edges[:-1] + widths * 0.1, counts, width=widths * 0.8, align='edge')
+    ax.set_title(title)
+    ax.set_ylabel('Number of students')
+    ax.set_xlabel('Score')
+    fig.savefig(output_png)
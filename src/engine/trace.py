@@ -0,0 +1,131 @@
+"""
+Lightweight per-stage instrumentation.
+
+Enabled by setting GRADEPARSER_TRACE to the path of the trace file (or to 1 for 'gradeparser_trace.json'),
+or by main.py --trace. Each stage records its wall time, row count and peak memory, and the trace is written
+on exit in the Chrome trace event format, which can be opened in chrome://tracing or https://ui.perfetto.dev.
+When disabled, a stage costs one attribute check.
+"""
+from pathlib import Path
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+
+TRACE_FILE = os.environ.get('GRADEPARSER_TRACE', '')
+if TRACE_FILE == '1':
+    TRACE_FILE = 'gradeparser_trace.json'
+
+# Finished stages, in the order they ended
+events: list[dict] = []
+_stack = threading.local()
+_start = time.perf_counter()
+
+"""
+Whether stages are recorded.
+"""
+def enabled() -> bool:
+    return bool(TRACE_FILE)
+
+"""
+Turn on tracing at runtime, writing to the given file on exit.
+"""
+def enable(trace_file='gradeparser_trace.json'):
+    global TRACE_FILE
+    if not TRACE_FILE:
+        atexit.register(dump)
+    TRACE_FILE = str(trace_file)
+
+class Stage:
+    """
+    Context manager recording one stage. Set rows inside the block to record the number of rows it produced,
+    and size to record the bytes of what it produced, e.g. the memory usage of a DataFrame.
+    Nested stages are shown inside their parent, and the parent's peak memory includes theirs.
+    """
+    def __init__(self, name, category='stage'):
+        self.name = name
+        self.category = category
+        self.rows = None
+        self.size = None
+        self.peak = 0
+
+    def __enter__(self):
+        if not TRACE_FILE:
+            return self
+        stack = _stack.__dict__.setdefault('stages', [])
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif stack:
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+        stack.append(self)
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not TRACE_FILE:
+            return False
+        end = time.perf_counter()
+        stack = _stack.stages
+        stack.pop()
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+        args = {'peak MB': round(max(self.peak - self.base, 0) / 1e6, 3)}
+        if self.rows is not None:
+            args['rows'] = int(self.rows)
+        if self.size is not None:
+            args['size MB'] = round(self.size / 1e6, 3)
+        if exc[0] is not None:
+            args['error'] = exc[0].__name__
+        events.append({'name': self.name, 'cat': self.category, 'ph': 'X',
+                       'ts': round((self.begin - _start) * 1e6), 'dur': round((end - self.begin) * 1e6),
+                       'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+        return False
+
+"""
+Record a stage, e.g.
+    with stage('Parse ZINC reports') as s:
+        zinc = ...
+        s.rows = zinc.shape[0]
+"""
+def stage(name, category='stage') -> Stage:
+    return Stage(name, category)
+
+"""
+Call fn(*args) on a worker process, returning its result with the stages it recorded, so that the process that
+submitted it can add them to its own trace, see engine.batch.runBatch. Worker processes never write the trace file.
+"""
+def traced(fn, *args) -> tuple:
+    start = len(events)
+    result = fn(*args)
+    return result, events[start:]
+
+"""
+Totals of each stage name in the order they first ran: (name, calls, total seconds, rows of the last call, max peak MB).
+"""
+def summary() -> list[tuple]:
+    totals = {}
+    for event in events:
+        name, calls, seconds, rows, peak = totals.get(event['name'], (event['name'], 0, 0.0, None, 0.0))
+        totals[event['name']] = (name, calls + 1, seconds + event['dur'] / 1e6,
+                                 event['args'].get('rows', rows), max(peak, event['args']['peak MB']))
+    return list(totals.values())
+
+"""
+Write the recorded stages as a Chrome trace JSON file, to TRACE_FILE by default.
+"""
+def dump(trace_file=None):
+    trace_file = trace_file or TRACE_FILE
+    if not trace_file or not events or multiprocessing.parent_process() is not None:
+        return None
+    with open(trace_file, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return Path(trace_file)
+
+if TRACE_FILE:
+    atexit.register(dump)
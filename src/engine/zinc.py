@@ -0,0 +1,153 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from engine.cache import readExcels, iterExcels
+from engine.trace import stage
+from engine.policy import POLICY_FIRST, POLICY_LATEST, POLICY_HIGHEST, POLICY_LEAST_LATE, POLICY_FILE, POLICIES, DEFAULT_POLICY
+
+"""
+Read ZINC reports into a single DataFrame with one row per ITSC.
+
+If there are duplicate ITSCs when combining sheets, the policy decides which row to keep, see chooseRows.
+This happens if the TA submits to all sessions for checking, or a student was able to submit to
+multiple sessions due to lab swap.
+The reports are merged one at a time, see mergeZINCreports, and review is called as in resolveDuplicates.
+"""
+def readZINCreports(zinc_xlsxs, policy=DEFAULT_POLICY, preferFile=None, review=None, progress=None) -> pd.DataFrame:
+    with stage('Merge ZINC reports') as s:
+        zinc, conflicts = mergeZINCreports(zinc_xlsxs, policy, preferFile, progress)
+        s.rows = zinc.shape[0]
+    if review is not None and not conflicts.empty:
+        reviewed = review(conflicts, zinc.index.intersection(conflicts.index))
+        if reviewed is not None:
+            zinc = pd.concat([zinc.drop(index=conflicts.index, errors='ignore'), conflicts.loc[list(reviewed)]]).sort_index()
+    zinc.drop(columns=['File'], inplace=True)
+    return zinc
+
+"""
+Merge ZINC reports one at a time into a running table of the row kept for each ITSC by the policy, see chooseRows.
+Only this table, the report being merged and the rows of duplicated ITSCs are held in memory, never the concatenation
+of every report, and the test case columns are compacted, see compactTestcases. Rows are numbered across the reports in order, as in concatZINCreports, so the policies pick the same rows.
+Returns the kept rows, with the name of their report in the File column, and every row of the duplicated ITSCs.
+progress(done, total) is called after each report, see engine.cache.iterExcels.
+"""
+def mergeZINCreports(zinc_xlsxs, policy=DEFAULT_POLICY, preferFile=None, progress=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Rows kept from each merged report, so the reports without competing rows are not copied again
+    parts = []
+    # Index of the part holding the kept row of each ITSC
+    owners = {}
+    conflicts = []
+    recorded = pd.Index([])
+    start = 0
+    for zinc_xlsx, zinc in zip(zinc_xlsxs, iterExcels(zinc_xlsxs, sheet_name=0, progress=progress)):
+        zinc = compactTestcases(zinc)
+        zinc['File'] = Path(zinc_xlsx).name
+        zinc.index = pd.RangeIndex(start, start + zinc.shape[0])
+        start += zinc.shape[0]
+
+        # Only the kept rows of the ITSCs in this report compete with its rows
+        candidates = []
+        for i in sorted(set(map(owners.get, zinc['ITSC'])) - {None}):
+            competing = parts[i]['ITSC'].isin(zinc['ITSC'])
+            candidates.append(parts[i].loc[competing])
+            parts[i] = parts[i].loc[~competing]
+        candidates = pd.concat(candidates + [zinc]).sort_index() if candidates else zinc
+
+        # Rows of ITSCs seen more than once, the kept ones being recorded with the first duplicate
+        duplicates = candidates.duplicated(subset=['ITSC'], keep=False)
+        if duplicates.any():
+            duplicated = candidates.loc[duplicates & ~candidates.index.isin(recorded)]
+            conflicts.append(duplicated)
+            recorded = recorded.append(duplicated.index)
+            candidates = candidates.loc[chooseRows(candidates, policy, preferFile)]
+
+        parts.append(candidates)
+        owners.update(dict.fromkeys(candidates['ITSC'], len(parts) - 1))
+    if not parts:
+        raise ValueError('No ZINC reports to read')
+    kept = pd.concat(parts)
+    parts.clear()
+    kept.sort_index(inplace=True)
+    conflicts = pd.concat(conflicts).sort_index() if conflicts else kept.iloc[:0]
+    return kept, conflicts
+
+"""
+Store the integer test case columns of a ZINC report, the columns after Late Submission, in the smallest integer type.
+Results are mostly 0 or 1, so a report with many test cases takes a fraction of the memory.
+"""
+def compactTestcases(zinc: pd.DataFrame) -> pd.DataFrame:
+    columns = [column for column in zinc.columns[4:] if pd.api.types.is_integer_dtype(zinc[column])]
+    if not columns or zinc.empty:
+        return zinc
+    values = zinc[columns].to_numpy()
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= values.min() and values.max() <= np.iinfo(dtype).max:
+            compact = dict(zip(columns, values.astype(dtype).T))
+            return pd.DataFrame({column: compact.get(column, zinc[column]) for column in zinc.columns}, index=zinc.index)
+    return zinc
+
+"""
+Read ZINC reports into a single DataFrame, keeping the duplicates.
+The name of the report of each row is stored in the File column.
+progress(done, total) is called after each report, see engine.cache.readExcels.
+"""
+def concatZINCreports(zinc_xlsxs, progress=None) -> pd.DataFrame:
+    zincs = [zinc.assign(File=Path(zinc_xlsx).name) for zinc_xlsx, zinc in zip(zinc_xlsxs, readExcels(zinc_xlsxs, sheet_name=0, progress=progress))]
+    zinc = pd.concat(zincs)
+    zinc.reset_index(drop=True, inplace=True)
+    return zinc
+
+"""
+Late minutes of each row, 0 for submissions on time.
+ZINC writes the lateness as text such as '15.25 mins'.
+"""
+def lateMinutes(late: pd.Series) -> pd.Series:
+    return pd.to_numeric(late.fillna('').astype(str).str.extract(r'(\d+(?:\.\d*)?)', expand=False), errors='coerce').fillna(0)
+
+"""
+Index of the row kept for each ITSC according to the policy:
+- latest: the row from the last report, reports are expected in the order of their deadlines
+- first: the row from the first report
+- highest: the highest score, ties go to the latest report
+- least-late: the fewest late minutes, ties go to the highest score
+- file: the row from the report named preferFile, otherwise the latest report
+"""
+def chooseRows(zinc: pd.DataFrame, policy=DEFAULT_POLICY, preferFile=None) -> pd.Index:
+    order = pd.Series(range(zinc.shape[0]), index=zinc.index)
+    if policy == POLICY_FIRST:
+        keys = [-order]
+    elif policy == POLICY_LATEST:
+        keys = [order]
+    elif policy == POLICY_HIGHEST:
+        keys = [zinc['Score'].fillna(float('-inf')), order]
+    elif policy == POLICY_LEAST_LATE:
+        keys = [-lateMinutes(zinc['Late Submission']), zinc['Score'].fillna(float('-inf')), order]
+    elif policy == POLICY_FILE:
+        preferred = zinc['File'].eq(Path(preferFile).name) if preferFile else pd.Series(False, index=zinc.index)
+        keys = [preferred, order]
+    else:
+        raise ValueError('Unknown duplicate policy "{}", expected one of {}'.format(policy, POLICIES))
+
+    # The last row of each ITSC after sorting by the keys is the best one
+    ranked = pd.DataFrame({'ITSC': zinc['ITSC'], **{i: key for i, key in enumerate(keys)}})
+    ranked.sort_values(list(range(len(keys))), kind='stable', inplace=True)
+    return ranked.drop_duplicates(subset=['ITSC'], keep='last').index.sort_values()
+
+"""
+Keep one row per ITSC, chosen by the policy.
+
+If review is given, it is called once as review(conflicts, kept) with all rows of the duplicated ITSCs
+and the indices picked by the policy. It returns the indices to keep instead, or None to accept the policy.
+"""
+def resolveDuplicates(zinc: pd.DataFrame, policy=DEFAULT_POLICY, preferFile=None, review=None) -> pd.DataFrame:
+    with stage('Choose duplicate rows') as s:
+        kept = chooseRows(zinc, policy, preferFile)
+        s.rows = zinc.shape[0]
+    if review is not None:
+        conflicts = zinc.loc[zinc.duplicated(subset=['ITSC'], keep=False)]
+        if not conflicts.empty:
+            reviewed = review(conflicts, kept.intersection(conflicts.index))
+            if reviewed is not None:
+                kept = kept.difference(conflicts.index).union(pd.Index(reviewed)).sort_values()
+    return zinc.loc[kept]
@@ -1,13 +1,22 @@
+from __future__ import annotations
+
 from tkinter import ttk
 from tkinter import filedialog, messagebox
 
 from pathlib import Path
-import pandas as pd
+from functools import partial
+from typing import TYPE_CHECKING
 
 from asgnApp import AsgnApp
+from engine.trace import stage
 from utility import Table, askcombobox
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 class HwApp(AsgnApp):
+    sessionKind = 'hw'
+
     def __init__(self, master = None):
         super().__init__(master)
 
@@ -15,11 +24,10 @@ class HwApp(AsgnApp):
         self.pack()
         self.padding = 10
         self.master.title('Homework Grade Parser')
-        self.master.geometry('900x480')
+        self.master.geometry('900x530')
 
-        # DataFrames for ZINC scores and summary
+        # DataFrame for ZINC scores
         self.zinc: pd.DataFrame = None
-        self.scores: pd.DataFrame = None
 
         # UI components
         self.canvasCSVLabel = ttk.Label(self, text='Select the Canvas CSV file:', width=40)
@@ -51,51 +59,51 @@ class HwApp(AsgnApp):
     Assignment selection event handler
     """
     def assignmentSelected(self, event):
-        self.assignmentLabel = self.assignmentSelectionCombobox.get()
-        self.zincButton.config(state='normal')
-        self.updateTable()
+        def loaded():
+            self.zincButton.config(state='normal')
+            self.updateTable()
+        self.loadAssignment(loaded)
 
     """
     Import ZINC report event handler
     """
     def zincButtonPressed(self):
-        self.parseHWreport()
-        self.zincButton.config(state='disabled')
+        self.parseHWreport(lambda: self.zincButton.config(state='disabled'))
 
     """
     Process homework gradefile.
     Accepts a single Excel file, which should contain one column with ITSC emails, and another column with the total score.
-    There will be prompts for user to select these 2 columns if the default names are not found (SIS Login ID and Total).
+    There will be prompts for user to select these 2 columns if the default names are not found (SIS Login ID and Total),
+    unless they were selected before for a gradefile of the same template, see engine.hw.resolveColumns.
 
     The total scores are parsed directly into the Canvas CSV for export, without being scaled.
+    The gradefile is parsed in the background, then imported() is called.
     """
-    def parseHWreport(self):
+    def parseHWreport(self, imported=None):
         # Open homework gradefile
         report_xlsx = filedialog.askopenfilename(filetypes=[('Excel files', '.xlsx .xls')], title='Select the homework .xlsx gradefile:')
         if report_xlsx == '':
             return
-        
-        # Default column names
-        SID_COLUMN = 'SIS Login ID'
-        TOT_COLUMN = 'Total'
-
-        # If above columns are not found, ask for user specification
-        self.report = pd.read_excel(report_xlsx, sheet_name=0)
-        columns = list(self.report.columns)
-        sid_col = SID_COLUMN
-        tot_col = TOT_COLUMN
-        if SID_COLUMN not in self.report.columns:
-            sid_col = askcombobox('ITSC email column', 'Select the column containing ITSC emails:', columns)
-        if TOT_COLUMN not in self.report.columns:
-            tot_col = askcombobox('Total score column', 'Select the column containing total scores:', columns)
-        self.report.rename(columns={sid_col: SID_COLUMN, tot_col:TOT_COLUMN}, inplace=True)
-
-        # Fill scores into grades DataFrame
-        self.report.dropna(subset=[SID_COLUMN], inplace=True)
-        self.scores = self.report.loc[:,[SID_COLUMN, TOT_COLUMN]].rename(columns={TOT_COLUMN: self.assignmentLabel}).set_index(SID_COLUMN).reindex(self.grades[SID_COLUMN])
-        self.grades.fillna(self.scores.reset_index(), inplace=True)
-        self.grades[self.assignmentLabel].fillna(0, inplace=True)
-        self.updateTable()
-
-        # Enable output button
-        self.generateButton.config(state='normal')
+
+        # If the default columns are not found, ask for user specification on the UI thread
+        assignmentLabel = self.assignmentLabel
+        def task(progress):
+            from engine.hw import parseHWreport
+            with stage('Parse homework gradefile') as s:
+                report = parseHWreport(report_xlsx, assignmentLabel, partial(self.callInMainThread, askcombobox))
+                s.rows = report.shape[0]
+            return report
+
+        def done(report):
+            self.report = report
+
+            # Fill scores into grades DataFrame
+            self.mergeScores()
+            self.updateTable([self.assignmentLabel])
+
+            # Enable output button
+            self.generateButton.config(state='normal')
+            if imported is not None:
+                imported()
+
+        self.runTask('Parse homework gradefile', task, done)
@@ -1,12 +1,21 @@
-from tkinter import ttk
-from tkinter import filedialog
+from __future__ import annotations
 
-import pandas as pd
+from tkinter import ttk
+from tkinter import filedialog, messagebox
+from typing import TYPE_CHECKING
 
 from asgnApp import AsgnApp
-from utility import Table, askcombobox
+from engine.trace import stage
+from utility import Table
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class LabApp(AsgnApp):
+    sessionKind = 'lab'
+    sessionFrames = AsgnApp.sessionFrames + ['attendance', 'zinc', 'question']
+    sessionFlags = ['attendanceFlag', 'zincFlag', 'questionFlag']
+
     def __init__(self, master = None):
         super().__init__(master)
 
@@ -14,13 +23,12 @@ class LabApp(AsgnApp):
         self.pack()
         self.padding = 10
         self.master.title('COMP2012 Lab Grade Parser')
-        self.master.geometry('900x480')
+        self.master.geometry('900x530')
 
-        # DataFrames for Attendance, ZINC scores, Question scores and summary
+        # DataFrames for Attendance, ZINC scores and Question scores
         self.attendance: pd.DataFrame = None
         self.zinc: pd.DataFrame = None
         self.question: pd.DataFrame = None
-        self.scores: pd.DataFrame = None
 
         # Flags to check all 3 components have been imported
         self.attendanceFlag: bool = False
@@ -90,108 +98,131 @@ class LabApp(AsgnApp):
     Assignment selection event handler
     """
     def assignmentSelected(self, event):
-        self.assignmentLabel = self.assignmentSelectionCombobox.get()
-        self.attendanceButton.config(state='normal')
-        self.questionButton.config(state='normal')
-        self.zincButton.config(state='normal')
-        self.updateTable()
+        def loaded():
+            self.attendanceButton.config(state='normal')
+            self.questionButton.config(state='normal')
+            self.zincButton.config(state='normal')
+            self.updateTable()
+        self.loadAssignment(loaded)
 
     """
     Import attendance event handler
+    Each component can be imported again, e.g. after regrades, to update the scores of the students whose rows changed.
     """
     def attendanceButtonPressed(self):
-        self.parseLabAttendance()
-        self.attendanceFlag = True
-        if self.attendanceFlag and self.zincFlag and self.questionFlag:
-            self.processLabScores()
-        self.attendanceButton.config(state='disabled')
+        previous = self.attendance
+        def imported():
+            self.attendanceFlag = True
+            self.componentImported(previous, self.attendance, 'attendance')
+        self.parseLabAttendance(imported)
 
     """
     Import ZINC reports event handler
     """
     def zincButtonPressed(self):
-        self.parseLabZINCreports()
-        self.zincFlag = True
-        if self.attendanceFlag and self.zincFlag and self.questionFlag:
-            self.processLabScores()
-        self.zincButton.config(state='disabled')
+        previous = self.zinc
+        def imported():
+            self.zincFlag = True
+            self.componentImported(previous, self.zinc, 'zinc')
+        self.parseLabZINCreports(imported)
 
     """
     Import question score event handler
     """
     def questionButtonPressed(self):
-        self.parseLabQuestions()
-        self.questionFlag = True
-        if self.attendanceFlag and self.zincFlag and self.questionFlag:
+        previous = self.question
+        def imported():
+            self.questionFlag = True
+            self.componentImported(previous, self.question, 'question')
+        self.parseLabQuestions(imported)
+
+    """
+    Calculate the lab scores once all 3 components have been imported.
+    When a component is imported again, only the students whose rows of that component changed are rescored.
+    Components imported before the others are saved in the session, so they need not be imported again after a restart.
+    """
+    def componentImported(self, previous, current, component):
+        if not (self.attendanceFlag and self.zincFlag and self.questionFlag):
+            self.saveSession()
+            return
+        if self.report is None or previous is None:
             self.processLabScores()
-        self.questionButton.config(state='disabled')
+        else:
+            self.updateLabScores(previous, current, component)
 
     """
     Process attendance sheet.
     Supports multiple Excel files, though only one should be needed under current arrangement.
     The Excel file(s) should contain 1 sheet named 'Tally', containing Email, Name and Score columns. 
+    The files are parsed in the background, then imported() is called.
     """
-    def parseLabAttendance(self):
+    def parseLabAttendance(self, imported=None):
         # Open attendance reports
         attendance_xlsxs = filedialog.askopenfilenames(filetypes=[('Excel files', '.xlsx .xls')], title='Select the attendance .xlsx gradefiles:')
         if attendance_xlsxs == '':
             return
 
         # Parse all reports into a single DataFrame
-        attendances = [pd.read_excel(attendance_xlsx, sheet_name='Tally') for attendance_xlsx in attendance_xlsxs]
-        self.attendance = pd.concat(attendances)
-        self.attendance.drop_duplicates(subset=['Email'], inplace=True)
+        def task(progress):
+            from engine.lab import parseLabAttendance
+            with stage('Parse attendance') as s:
+                attendance = parseLabAttendance(attendance_xlsxs, progress)
+                s.rows = attendance.shape[0]
+            return attendance
+
+        def done(attendance):
+            self.attendance = attendance
+            if imported is not None:
+                imported()
+
+        self.runTask('Parse attendance', task, done)
 
     """
     Process ZINC reports.
     Supports multiple Excel files, downloaded from ZINC. Each lab session has one submission module for different due dates.
     The Excel files should contain 1 sheet with ITSC, Name and Score columns.
 
-    If there are duplicate ITSCs when combining sheets, a message box will ask for which score to keep. 
-    This happens if the TA submits to all sessions for checking (in which case select any option),
+    If there are duplicate ITSCs when combining sheets, the latest report is kept by default and a single dialog lists all of them
+    to switch the policy or pick the rows to keep.
+    This happens if the TA submits to all sessions for checking (in which case keep any row),
     or a student was able to submit to multiple sessions due to lab swap. Manually check ZINC to see which one is more recent.
 
     Automatically generates Email column for compatibility, and scale the ZINC score based on user-specified maximum score.
     It is recommended to always set ZINC lab score to 100 maximum, so that you don't accidentally forget this step. 
+    The reports are parsed in the background, then imported() is called.
     """
-    def parseLabZINCreports(self):
+    def parseLabZINCreports(self, imported=None):
         # Open ZINC reports
         zinc_xlsxs = filedialog.askopenfilenames(filetypes=[('Excel files', '.xlsx .xls')], title='Select the ZINC .xlsx gradefiles:')
         if zinc_xlsxs == '':
             return
 
-        # Parse all reports into a single DataFrame
-        zincs = [pd.read_excel(zinc_xlsx, sheet_name=0) for zinc_xlsx in zinc_xlsxs]
-        self.zinc = pd.concat(zincs)
-
-        # Handle duplicates
-        self.zinc.reset_index(inplace=True)
-        self.zinc['Summary'] = self.zinc.apply(lambda row: '{}: Score: {}, Late: {}'.format(row['Name'], row['Score'], row['Late Submission']), axis=1)
-        duplicates = self.zinc.loc[self.zinc.duplicated(subset=['ITSC'], keep=False)]
-        itscs = duplicates['ITSC'].drop_duplicates()
-        for itsc in itscs:
-            options = []
-            for _, row in duplicates[duplicates['ITSC'] == itsc].iterrows():
-                options.append(row['Summary'])
-            keep = askcombobox('Duplicate', 'Select the score you want to keep for student {}'.format(itsc), options)
-            index = self.zinc[(self.zinc['ITSC'] == itsc) & (self.zinc['Summary'] != keep)].index
-            self.zinc.drop(index=index, inplace=True)
-
-        # Cleanup
-        self.zinc.drop_duplicates(subset=['ITSC'], inplace=True)
-        self.zinc['Email'] = self.zinc['ITSC'] + '@connect.ust.hk'
-        self.zinc['ZINC'] = self.zinc['Score'].div(self.zincMax)
-
-        # Change default number of labs
-        self.numLabSessionSpinbox.set(len(zincs))
+        # Parse all reports into a single DataFrame, handling duplicates
+        zincMax = self.zincMax
+        def task(progress):
+            from engine.lab import parseLabZINCreports
+            with stage('Parse ZINC reports') as s:
+                zinc = parseLabZINCreports(zinc_xlsxs, zincMax, self.duplicatePolicy, review=self.reviewDuplicates, progress=progress)
+                s.rows = zinc.shape[0]
+            return zinc
+
+        def done(zinc):
+            self.zinc = zinc
+            # Change default number of labs
+            self.numLabSessionSpinbox.set(len(zinc_xlsxs))
+            if imported is not None:
+                imported()
+
+        self.runTask('Parse ZINC reports', task, done)
     
     """
     Process question score sheet.
     Accepts a single Excel file with the first N sheets containing question score for each lab session, N for number of lab sessions.
     The number of lab sessions is automatically set if ZINC reports are imported first.
     Each sheet should contain Email, Name, 'Lucky?' and 'Question score' columns.
+    The sheets are parsed in the background, then imported() is called.
     """
-    def parseLabQuestions(self):
+    def parseLabQuestions(self, imported=None):
         # Open question report
         question_xlsx = filedialog.askopenfilename(filetypes=[('Excel files', '.xlsx .xls')], title='Select the question .xlsx gradefile:')
         numLabs = int(self.numLabSessionSpinbox.get())
@@ -199,9 +230,19 @@ class LabApp(AsgnApp):
             return
 
         # Parse all tabs into a single DataFrame
-        questions = [pd.read_excel(question_xlsx, sheet_name=i) for i in range(numLabs)]
-        self.question = pd.concat(questions)
-        self.question.drop_duplicates(subset=['Email'], inplace=True)
+        def task(progress):
+            from engine.lab import parseLabQuestions
+            with stage('Parse question scores') as s:
+                question = parseLabQuestions(question_xlsx, numLabs)
+                s.rows = question.shape[0]
+            return question
+
+        def done(question):
+            self.question = question
+            if imported is not None:
+                imported()
+
+        self.runTask('Parse question scores', task, done)
 
     """
     Calculate lab scores when all 3 components have been imported.
@@ -211,20 +252,50 @@ class LabApp(AsgnApp):
     The scores will be viewable on the table and the output CSV is ready to be exported.
     """
     def processLabScores(self):
-        # Merge and process score
-        self.report = self.attendance.merge(self.question.loc[:, ['Email', 'Lucky?', 'Question score']], how='left', on='Email')
-        self.report = self.report.merge(self.zinc.loc[:, ['Email', 'ZINC']], how='left', on='Email')
-        self.report['Question score'].fillna(0, inplace=True)
-        self.report['ZINC'].fillna(0, inplace=True)
-        self.report['Total'] = self.report.apply(lambda row: row['Attendance'] + row['ZINC'] + (row['Question score'] if row['Lucky?'] == 'Yes' else row['ZINC']), axis=1)
-        self.report['Total'] = self.report['Total'].round(2).apply(str)
-        self.report.rename(columns={'Email': 'SIS Login ID', 'Total': self.assignmentLabel}, inplace=True)
-
-        # Fill scores into grades DataFrame
-        self.scores = self.report.loc[:,['SIS Login ID', self.assignmentLabel]].set_index('SIS Login ID').reindex(self.grades['SIS Login ID'])
-        self.grades.fillna(self.scores.reset_index(), inplace=True)
-        self.grades[self.assignmentLabel].fillna(0, inplace=True)
-        self.updateTable()
-
-        # Enable output button
-        self.generateButton.config(state='normal')
+        # Merge and process score in the background
+        attendance, question, zinc, assignmentLabel = self.attendance, self.question, self.zinc, self.assignmentLabel
+        def task(progress):
+            from engine.lab import processLabScores
+            with stage('Calculate lab scores') as s:
+                report = processLabScores(attendance, question, zinc, assignmentLabel)
+                s.rows = report.shape[0]
+            return report
+
+        def done(report):
+            self.report = report
+
+            # Fill scores into grades DataFrame
+            self.mergeScores()
+            self.updateTable([self.assignmentLabel] + self.extraColumns)
+
+            # Enable output button
+            self.generateButton.config(state='normal')
+
+        self.runTask('Calculate lab scores', task, done)
+
+    """
+    Rescore the students whose rows of a re-imported component changed,
+    then patch their scores into the self.grades DataFrame and the table.
+    """
+    def updateLabScores(self, previous, current, component):
+        report, attendance, question, zinc, assignmentLabel = self.report, self.attendance, self.question, self.zinc, self.assignmentLabel
+        def task(progress):
+            from engine.lab import changedStudents, updateLabScores, ATTENDANCE_COLUMNS, QUESTION_COLUMNS, ZINC_COLUMNS
+            columns = {'attendance': ATTENDANCE_COLUMNS, 'question': QUESTION_COLUMNS, 'zinc': ZINC_COLUMNS}[component]
+            with stage('Update lab scores') as s:
+                students = changedStudents(previous, current, columns)
+                s.rows = len(students)
+                if len(students) == 0:
+                    return students, report
+                return students, updateLabScores(report, attendance, question, zinc, assignmentLabel, students)
+
+        def done(result):
+            students, self.report = result
+            if len(students) == 0:
+                self.saveSession()
+                messagebox.showinfo(title='No changes', message='No score changed since the last import.')
+                return
+            self.patchScores(students)
+            self.updateTable([self.assignmentLabel] + self.extraColumns)
+
+        self.runTask('Update lab scores', task, done)
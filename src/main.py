@@ -1,5 +1,153 @@
-from selectionApp import selectionApp
+import argparse
+import multiprocessing
+import os
+import sys
+
+"""
+Command line arguments for batch mode.
+Either a single job is described by the arguments, or a list of jobs is loaded from a JSON file.
+"""
+def parseArguments(argv):
+    from engine.assignment import loadTypes
+
+    parser = argparse.ArgumentParser(description='COMP2012/2611 Grade Parser')
+    parser.add_argument('--batch', action='store_true', help='Run without GUI')
+    parser.add_argument('--jobs', help='JSON file containing a job or a list of jobs')
+    parser.add_argument('--combine', action='store_true', help='Load each Canvas CSV once and write all its assignments to one combined CSV')
+    parser.add_argument('--lookup', metavar='STUDENT', help='Show the stored scores of a student, by ITSC, SIS User ID or name')
+    parser.add_argument('--lookup-db', help='Lookup store to query, defaults to GRADEPARSER_LOOKUP or ~/.local/share/gradeparser/lookup.db')
+    parser.add_argument('--testcases', action='store_true', help='With --lookup, also show the result of every test case')
+    parser.add_argument('--similarity', metavar='SUBMISSIONS', help='Rank pairs of C++ submissions by similarity, one subdirectory or file per student')
+    parser.add_argument('--base', help='With --similarity, skeleton code to ignore')
+    parser.add_argument('--trace', nargs='?', const='gradeparser_trace.json', help='Record the time and memory of each stage to a Chrome trace file')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--type', choices=list(dict.fromkeys(['lab', 'pa', 'hw'] + list(loadTypes()))),
+                        help='Type of assignment, or the name of an assignment type defined in GRADEPARSER_TYPES')
+    parser.add_argument('--canvas', help='Canvas Grade Export .csv file')
+    parser.add_argument('--assignment', help='Assignment column in Canvas, e.g. "Lab 2 (309931)"')
+    parser.add_argument('--output', help='Output .csv file')
+    parser.add_argument('--export', choices=['full', 'column', 'changed'], default='full',
+                        help='Write the whole gradebook, only the identity and assignment columns, or only the changed scores')
+    parser.add_argument('--previous', help='With --export changed, the .csv exported earlier to compare the scores with')
+    parser.add_argument('--zinc-max', type=float, default=100, help='Maximum ZINC score')
+    parser.add_argument('--zinc', nargs='+', default=[], help='ZINC .xlsx report(s)')
+    parser.add_argument('--attendance', nargs='+', default=[], help='Attendance .xlsx sheet(s)')
+    parser.add_argument('--question', help='Question score .xlsx sheet')
+    parser.add_argument('--duplicate-policy', choices=['latest', 'first', 'highest', 'least-late', 'file'], default='latest',
+                        help='Row to keep when an ITSC appears in several ZINC reports')
+    parser.add_argument('--prefer-file', help='ZINC report to keep with --duplicate-policy file')
+    parser.add_argument('--num-labs', type=int, help='Number of lab sessions')
+    parser.add_argument('--report', help='Homework .xlsx gradefile')
+    parser.add_argument('--sid-column', help='Homework column containing ITSC emails (default: SIS Login ID, or the column remembered for the template)')
+    parser.add_argument('--total-column', help='Homework column containing total scores (default: Total, or the column remembered for the template)')
+    parser.add_argument('--input', nargs='+', action='append', default=[], metavar='NAME FILE',
+                        help='Input of an assignment type followed by its .xlsx file(s), repeated for each input')
+    parser.add_argument('--parameter', action='append', default=[], metavar='NAME=VALUE', help='Parameter of an assignment type, repeated for each parameter')
+    args = parser.parse_args(argv)
+    if args.batch and not args.jobs and not (args.type and args.canvas and args.assignment):
+        parser.error('--batch requires either --jobs or --type, --canvas and --assignment')
+    if any(len(files) < 2 for files in args.input):
+        parser.error('--input requires the name of the input followed by its file(s)')
+    try:
+        args.parameter = {name: float(value) for name, value in (parameter.split('=', 1) for parameter in args.parameter)}
+    except ValueError:
+        parser.error('--parameter requires NAME=VALUE with a number as the value')
+    return args
+
+"""
+Run the batch job(s) and report the result of each one.
+"""
+def runBatchMode(args) -> int:
+    from engine.batch import runBatch, runCombined, loadJobs
+
+    if args.jobs:
+        jobs = loadJobs(args.jobs)
+    else:
+        job = {'type': args.type, 'canvas': args.canvas, 'assignment': args.assignment, 'output': args.output,
+               'zincMax': args.zinc_max, 'zinc': args.zinc,
+               'duplicatePolicy': args.duplicate_policy, 'preferFile': args.prefer_file, 'attendance': args.attendance, 'question': args.question,
+               'report': args.report, 'sidColumn': args.sid_column, 'totalColumn': args.total_column,
+               'export': args.export, 'previous': args.previous}
+        if args.num_labs:
+            job['numLabs'] = args.num_labs
+        if args.input:
+            job['inputs'] = {name: files for name, *files in args.input}
+        if args.parameter:
+            job['parameters'] = args.parameter
+        jobs = [job]
+
+    if args.combine:
+        # One combined CSV per Canvas CSV, in the order the Canvas CSVs first appear
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job['canvas'], []).append(job)
+        results = [result for group in groups.values() for result in runCombined(group, workers=args.workers)]
+    else:
+        results = runBatch(jobs, args.workers)
+
+    failed = 0
+    for job, output_csv, error in results:
+        if error:
+            failed += 1
+            print('[FAILED] {}: {}'.format(job.get('assignment'), error), file=sys.stderr)
+        else:
+            print('[OK] {}: written to "{}"'.format(job.get('assignment'), output_csv))
+    return 1 if failed else 0
+
+"""
+Write the similarity report of the submissions in args.similarity.
+"""
+def runSimilarity(args) -> int:
+    from engine.similarity import rankSimilarity, writeSimilarity
+
+    ranked = rankSimilarity(args.similarity, args.base, workers=args.workers)
+    output_csv = args.output or 'similarity.csv'
+    writeSimilarity(ranked, output_csv)
+    print('{} similar pair(s) written to "{}"'.format(ranked.shape[0], output_csv))
+    return 0
+
+"""
+Print the stored scores of the students matching args.lookup.
+"""
+def runLookup(args) -> int:
+    from engine.lookup import findStudents, studentScores
+
+    students = findStudents(args.lookup, args.lookup_db)
+    if not students:
+        print('No student matches "{}"'.format(args.lookup), file=sys.stderr)
+        return 1
+    for login, itsc, sisUserId, name in students:
+        print('{} ({}, {})'.format(name, itsc, sisUserId))
+        for score in studentScores(login, args.lookup_db):
+            results = score['testcases']
+            passed = sum(1 for result in results.values() if result)
+            print('  {:<30}{:>8}{:>8}{:>8}  {}'.format(
+                score['assignment'],
+                '' if score['score'] is None else '{:.2f}'.format(score['score']),
+                '' if score['penalty'] is None else '{:g}'.format(score['penalty']),
+                '' if score['total'] is None else '{:.2f}'.format(score['total']),
+                score['remarks'] or ('{}/{} test cases passed'.format(passed, len(results)) if results else '')))
+            if args.testcases:
+                for testcase, result in results.items():
+                    print('    {:<40}{}'.format(testcase, '' if result is None else '{:g}'.format(result)))
+    return 0
 
 if __name__ == '__main__':
+    # Worker processes re-run the frozen executable, see engine.cache.readExcels and engine.batch.runBatch
+    multiprocessing.freeze_support()
+    args = parseArguments(sys.argv[1:])
+    if args.trace:
+        # Also set for worker processes, which import engine.trace again when they are spawned
+        os.environ['GRADEPARSER_TRACE'] = args.trace
+        from engine import trace
+        trace.enable(args.trace)
+    if args.lookup:
+        sys.exit(runLookup(args))
+    if args.similarity:
+        sys.exit(runSimilarity(args))
+    if args.batch:
+        sys.exit(runBatchMode(args))
+
+    from selectionApp import selectionApp
     app = selectionApp()
     app.mainloop()
@@ -1,16 +1,24 @@
+from __future__ import annotations
+
 from tkinter import ttk
 from tkinter import filedialog, messagebox
 
 from pathlib import Path
+from typing import TYPE_CHECKING
 import os
-import pandas as pd
-from matplotlib import pyplot as plt
-from math import isnan
 
 from asgnApp import AsgnApp
-from utility import Table, askcombobox
+from engine.trace import stage
+from utility import Table
+
+# matplotlib is only imported when the stats are generated
+if TYPE_CHECKING:
+    import pandas as pd
 
 class PaApp(AsgnApp):
+    sessionKind = 'pa'
+    sessionFrames = AsgnApp.sessionFrames + ['zinc']
+
     def __init__(self, master = None):
         super().__init__(master)
 
@@ -18,11 +26,10 @@ class PaApp(AsgnApp):
         self.pack()
         self.padding = 10
         self.master.title('COMP2012 PA Grade Parser')
-        self.master.geometry('900x480')
+        self.master.geometry('900x530')
 
-        # DataFrames for ZINC scores and summary
+        # DataFrame for ZINC scores
         self.zinc: pd.DataFrame = None
-        self.scores: pd.DataFrame = None
 
         # Modify extraColumns for COMP2012 PA
         self.extraColumns = ['Score', 'Penalty']
@@ -80,24 +87,32 @@ class PaApp(AsgnApp):
     Assignment selection event handler
     """
     def assignmentSelected(self, event):
-        self.assignmentLabel = self.assignmentSelectionCombobox.get()
-        self.zincButton.config(state='normal')
-        self.updateTable()
+        def loaded():
+            self.zincButton.config(state='normal')
+            self.updateTable()
+        self.loadAssignment(loaded)
+
+    """
+    Enable the buttons using the ZINC reports of a restored session
+    """
+    def sessionRestored(self):
+        super().sessionRestored()
+        self.statsButton.config(state='normal')
+        self.jplagButton.config(state='normal')
 
     """
     Import ZINC report event handler
     """
     def zincButtonPressed(self):
-        self.parsePAreport()
-        self.zincButton.config(state='disabled')
+        self.parsePAreport(lambda: self.zincButton.config(state='disabled'))
 
     """
     Process ZINC report.
     Supports multiple Excel files, downloaded from ZINC.
     Typically only 1 file is needed, but in some cases there are multiple ZINC submission modules with different deadlines.
 
-    If there are duplicate ITSCs when combining sheets, a message box will ask for which score to keep.
-    Check ZINC to see which one is more recent if needed.
+    If there are duplicate ITSCs when combining sheets, the latest report is kept by default and a single dialog lists all of them
+    to switch the policy or pick the rows to keep. Check ZINC to see which one is more recent if needed.
 
     Automatically calculates total PA score using the formula: Total = max(ZINC / zincMax - Penalty, 0) where:
     - Penalty is the number of late minutes, rounded down
@@ -105,57 +120,45 @@ class PaApp(AsgnApp):
 
     Scores are then imported into the self.grades DataFrame, with absent students receiving 0.
     The scores will be viewable on the table and the output CSV is ready to be exported.
+    The reports are parsed in the background, then imported() is called.
     """
-    def parsePAreport(self):
+    def parsePAreport(self, imported=None):
         # Open reports
         zinc_xlsxs = filedialog.askopenfilenames(filetypes=[('Excel files', '.xlsx .xls')], title='Select the ZINC .xlsx gradefiles:')
         if zinc_xlsxs == '':
             return
 
-        # Parse all reports into a single DataFrame
-        zincs = [pd.read_excel(zinc_xlsx, sheet_name=0) for zinc_xlsx in zinc_xlsxs]
-        self.zinc = pd.concat(zincs)
-        
-        # Handle duplicates
-        self.zinc.reset_index(drop=True, inplace=True)
-        self.zinc['Summary'] = self.zinc.apply(lambda row: '{}: Score: {}, Late: {}'.format(row['Name'], row['Score'], row['Late Submission']), axis=1)
-        duplicates = self.zinc.loc[self.zinc.duplicated(subset=['ITSC'], keep=False)]
-        itscs = duplicates['ITSC'].drop_duplicates()
-        for itsc in itscs:
-            options = []
-            for _, row in duplicates[duplicates['ITSC'] == itsc].iterrows():
-                options.append(row['Summary'])
-            keep = askcombobox('Duplicate', 'Select the score you want to keep for student {}'.format(itsc), options)
-            index = self.zinc[(self.zinc['ITSC'] == itsc) & (self.zinc['Summary'] != keep)].index
-            self.zinc.drop(index=index, inplace=True)
-        self.zinc.drop_duplicates(subset=['ITSC'], inplace=True)
-        self.zinc.drop(columns=['Summary'], inplace=True)
-
-        # Process report
-        self.report = self.zinc.loc[:,['ITSC', 'Name', 'Score', 'Late Submission']]
-        self.report['Penalty'] = pd.to_numeric(self.report['Late Submission'].fillna('0.').str.split('.').str.get(0))
-        self.report['Total'] = (self.report['Score'] / self.zincMax * 100 - self.report['Penalty']).clip(lower=0)
-        self.report['Total'] = self.report['Total'].round(2).apply(str)
-        self.report['SIS Login ID'] = self.report['ITSC'] + '@connect.ust.hk'
-        self.report.rename(columns={'Total': self.assignmentLabel}, inplace=True)
-
-        # Fill scores into grades DataFrame
-        self.scores = self.report.loc[:,['SIS Login ID', self.assignmentLabel]].set_index('SIS Login ID').reindex(self.grades['SIS Login ID'])
-        self.scores = self.scores.astype({self.assignmentLabel: 'Float64'})
-        self.grades.fillna(self.scores.reset_index(), inplace=True)
-        self.grades[self.assignmentLabel].fillna(0, inplace=True)
-        self.updateTable()
-
-        # Enable output button(s)
-        self.statsButton.config(state='normal')
-        self.generateButton.config(state='normal')
-        self.jplagButton.config(state='normal')
+        # Parse all reports into a single DataFrame, handling duplicates, and process report
+        assignmentLabel, zincMax = self.assignmentLabel, self.zincMax
+        def task(progress):
+            from engine.pa import parsePAreport
+            with stage('Parse ZINC reports') as s:
+                result = parsePAreport(zinc_xlsxs, assignmentLabel, zincMax, self.duplicatePolicy, review=self.reviewDuplicates, progress=progress)
+                s.rows = result[1].shape[0]
+            return result
+
+        def done(result):
+            self.zinc, self.report = result
+
+            # Fill scores into grades DataFrame
+            self.mergeScores()
+            self.updateTable([self.assignmentLabel] + self.extraColumns)
+
+            # Enable output button(s)
+            self.statsButton.config(state='normal')
+            self.generateButton.config(state='normal')
+            self.jplagButton.config(state='normal')
+            if imported is not None:
+                imported()
+
+        self.runTask('Parse ZINC reports', task, done)
     
     """
     Generate stats for PA.
     - Score histogram
     - Score distribution & optional distribution by test case
-    - Lookup .csv file
+    - Lookup .csv file, and the scores in the lookup store of the term, see engine.lookup
+    The files are written in the background, see engine.stats.
     """
     def statsButtonPressed(self):
         # Ask for output directory
@@ -163,46 +166,71 @@ class PaApp(AsgnApp):
         if output_dir == '':
             output_dir = Path(self.grade_csv).parent
 
+        def task(progress):
+            self.writeStats(output_dir)
+
+        def done(result):
+            messagebox.showinfo(title='Finished processing', message='Stats written to "{}".'.format(output_dir))
+
+        self.runTask('Generate stats', task, done)
+
+    """
+    Write the histogram, stats and lookup CSV to the output directory
+    """
+    def writeStats(self, output_dir):
+        import numpy as np
+        from engine.stats import renderHistogram, writeStats
+        from engine.lookup import storeScores
+        from engine.canvas import formatColumn
+
         # Generate histogram
-        output_hist = Path(output_dir) / 'histogram.png'
-        fig = plt.hist(self.grades[self.assignmentLabel][(2 if self.hasManualPostingRow else 1):-1].astype('Float64'), bins=range(0, 101, 10), rwidth=0.8)
-        plt.title(self.assignmentName + ' Histogram')
-        plt.ylabel('Number of students')
-        plt.xlabel('Score')
-        plt.savefig(output_hist)
-        plt.close()
+        with stage('Histogram'):
+            output_hist = Path(output_dir) / 'histogram.png'
+            renderHistogram(output_hist, self.grades[self.assignmentLabel].iloc[(2 if self.hasManualPostingRow else 1):-1], self.assignmentName + ' Histogram')
 
         # Generate stats
-        stats_txt = Path(output_dir) / '{}_stats.txt'.format(self.assignmentName)
-        testcases = self.zinc.columns[4:]
-        with open(stats_txt, mode='w') as sf:
-            print('Mean: {:.2f}'.format(self.scores[self.assignmentLabel].mean()), file=sf)
-            print('SD: {:.2f}'.format(self.scores[self.assignmentLabel].std()), file=sf)
-            print('Max: {:.2f}'.format(self.scores[self.assignmentLabel].max()), file=sf)
-            print('Median: {:.2f}'.format(self.scores[self.assignmentLabel].median()), file=sf)
-            print('Min: {:.2f}'.format(self.scores[self.assignmentLabel].min()), file=sf)
-            print(file=sf)
-            testcaseStats = self.zinc[testcases].astype('Float64').sum() \
-                                .div(self.zinc.shape[0]).div(self.zinc[testcases].astype('Float64').max()) \
-                                .to_frame().rename(columns={0: 'Pass percentage'})
-            testcaseStats['Visualization'] = testcaseStats.apply(lambda row: '[{}]'.format(''.join(['=' if i/40 < row['Pass percentage'] else ' ' for i in range(40)])), axis=1)
-            print(testcaseStats.to_string(), file=sf)
+        with stage('Stats') as s:
+            stats_txt = Path(output_dir) / '{}_stats.txt'.format(self.assignmentName)
+            writeStats(stats_txt, self.scores[self.assignmentLabel], self.zinc)
+            s.rows = self.zinc.shape[0]
 
         # Generate lookup CSV
-        lookup_csv = Path(output_dir) / 'lookup' / 'score.csv'
-        if not os.path.exists(lookup_csv.parent):
-            os.mkdir(lookup_csv.parent)
-        lookup = self.table.loc[:, ['Student', 'SIS User ID', 'SIS Login ID', 'Score', 'Penalty', self.assignmentLabel]]
-        lookup.rename(columns={self.assignmentLabel: 'Total'}, inplace=True)
-        lookup.dropna(subset=['SIS User ID'], inplace=True)
-        lookup['Remarks'] = lookup.apply(lambda row: 'No submission' if isnan(row['Score']) else '', axis=1)
-        lookup.to_csv(lookup_csv, index=False)
-
-        messagebox.showinfo(title='Finished processing', message='Stats written to "{}".'.format(output_dir))
+        with stage('Lookup CSV') as s:
+            lookup_csv = Path(output_dir) / 'lookup' / 'score.csv'
+            if not os.path.exists(lookup_csv.parent):
+                os.mkdir(lookup_csv.parent)
+            lookup = self.table.loc[:, ['Student', 'SIS User ID', 'SIS Login ID', 'Score', 'Penalty', self.assignmentLabel]]
+            lookup.rename(columns={self.assignmentLabel: 'Total'}, inplace=True)
+            lookup.dropna(subset=['SIS User ID'], inplace=True)
+            lookup['Remarks'] = np.where(lookup['Score'].isna(), 'No submission', '')
+            lookup.assign(Total=formatColumn(lookup['Total'], lookup['Score'].isna().to_numpy())).to_csv(lookup_csv, index=False)
+            s.rows = lookup.shape[0]
+
+        # Add the scores and test case results to the lookup store
+        with stage('Lookup store') as s:
+            s.rows = storeScores(self.assignmentLabel, lookup, self.zinc)
 
     """
-    Generate JPlag report
-    TODO
+    Generate the code similarity report, in place of JPlag.
+    Asks for the directory of the submissions, with one subdirectory or .cpp file per student,
+    and optionally for the skeleton code, whose fragments are not counted as similar.
+    The pairs of students are ranked by similarity in the background, see engine.similarity.
     """
     def jplagButtonPressed(self):
-        messagebox.showwarning(message='This option will be implemented later!')
+        submissions_dir = filedialog.askdirectory(title='Select the directory of the submissions:')
+        if submissions_dir == '':
+            return
+        base = filedialog.askdirectory(title='Select the directory of the skeleton code (cancel if none):')
+        output_csv = Path(self.grade_csv).parent / '{}_similarity.csv'.format(self.assignmentName)
+
+        def task(progress):
+            from engine.similarity import rankSimilarity, writeSimilarity
+            ranked = rankSimilarity(submissions_dir, base or None, progress=progress)
+            writeSimilarity(ranked, output_csv)
+            return ranked
+
+        def done(ranked):
+            messagebox.showinfo(title='Finished processing',
+                                message='{} similar pair(s) written to "{}".'.format(ranked.shape[0], output_csv))
+
+        self.runTask('Compare submissions', task, done)
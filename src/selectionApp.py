@@ -1,10 +1,6 @@
 import tkinter as tk
 from tkinter import ttk
 
-from labApp import LabApp
-from paApp import PaApp
-from hwApp import HwApp
-
 COMP2012_LAB = 1
 COMP2012_PA  = 2
 GENERAL_HW  = 3
@@ -20,28 +16,43 @@ class selectionApp(tk.Frame):
         self.pack()
         self.padding = 10
 
+        # Assignment types defined in definition files, listed after the built-in ones
+        from engine.assignment import loadTypes
+        self.types = {name: definition for name, definition in loadTypes().items() if name not in ASSIGNMENT_DICT}
+
         self.master.title('COMP2012/2611 Grade Parser')
         self.master.geometry('600x200')
 
         self.assignmentTypeLabel = ttk.Label(self, text='Select the type of assignment:')
         self.assignmentTypeLabel.grid(row=0, column=0, padx=10, pady=10, sticky='ew')
 
-        self.assignmentTypeCombobox = ttk.Combobox(self, values=list(ASSIGNMENT_DICT.keys()), state='readonly', width=30)
+        self.assignmentTypeCombobox = ttk.Combobox(self, values=list(ASSIGNMENT_DICT.keys()) + list(self.types), state='readonly', width=30)
         self.assignmentTypeCombobox.grid(row=1, column=0, padx=10, pady=10)
         self.assignmentTypeCombobox.bind("<<ComboboxSelected>>", self.assignmentTypeSelected)
 
+    """
+    The app of the selected type is imported here rather than at startup, so the selection window appears quickly.
+    Plain import statements are kept so that the frozen executable still bundles the apps.
+    """
     def assignmentTypeSelected(self, event):
-        assignmentType = ASSIGNMENT_DICT[self.assignmentTypeCombobox.get()]
+        selected = self.assignmentTypeCombobox.get()
+        assignmentType = ASSIGNMENT_DICT.get(selected)
 
         self.master.destroy()
         asgnApp = None
 
         if (assignmentType == COMP2012_LAB):
+            from labApp import LabApp
             asgnApp = LabApp()
         elif (assignmentType == COMP2012_PA):
+            from paApp import PaApp
             asgnApp = PaApp()
         elif (assignmentType == GENERAL_HW):
+            from hwApp import HwApp
             asgnApp = HwApp()
+        else:
+            from typeApp import TypeApp
+            asgnApp = TypeApp(self.types[selected])
 
         if asgnApp is not None:
             asgnApp.mainloop()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from tkinter import ttk
+from tkinter import filedialog
+from typing import TYPE_CHECKING
+import re
+
+from asgnApp import AsgnApp
+from engine.trace import stage
+from utility import Table
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+class TypeApp(AsgnApp):
+    """
+    App of an assignment type defined in a definition file, see engine.assignment.
+    It has one import button per input and one entry per parameter, and scores the students with the formula
+    of the type once every input has been imported.
+    """
+    def __init__(self, definition: dict, master = None):
+        super().__init__(master)
+        from engine.assignment import displayedColumns, displayedHeaders
+
+        self.definition = definition
+        self.sessionKind = 'type-' + definition['name']
+
+        # Imported DataFrame of each input, kept as the attribute 'input_<name>' so it is saved in the session
+        self.inputNames: list[str] = list(definition['inputs'])
+        self.sessionFrames = AsgnApp.sessionFrames + [self.inputAttribute(name) for name in self.inputNames]
+        for name in self.inputNames:
+            setattr(self, self.inputAttribute(name), None)
+
+        # tk.Frame stuff
+        self.pack()
+        self.padding = 10
+        self.master.title('{} Grade Parser'.format(definition['name']))
+        self.master.geometry('900x530')
+
+        # Columns listed in the definition, or the columns of the formula once it is compiled
+        self.extraColumns = displayedHeaders(displayedColumns(definition))
+
+        # UI components
+        self.canvasCSVLabel = ttk.Label(self, text='Select the Canvas CSV file:', width=40)
+        self.canvasCSVLabel.grid(row=0, column=0, padx=10, pady=10, sticky='ew')
+
+        self.canvasCSVButton = ttk.Button(self, text='Browse', command=self.canvasCSVButtonPressed)
+        self.canvasCSVButton.grid(row=0, column=1, padx=10, pady=10)
+
+        self.assignmentSelectionLabel = ttk.Label(self, text='Select assignment:')
+        self.assignmentSelectionLabel.grid(row=1, column=0, padx=10, pady=10, sticky='ew')
+
+        self.assignmentSelectionCombobox = ttk.Combobox(self, state='readonly', width=30)
+        self.assignmentSelectionCombobox.grid(row=1, column=1, padx=10, pady=10)
+        self.assignmentSelectionCombobox.bind("<<ComboboxSelected>>", self.assignmentSelected)
+        self.assignmentSelectionCombobox.config(state='disabled')
+
+        self.gradeTable = Table(self)
+        self.gradeTable.grid(row=2, column=0, rowspan=3, columnspan=3)
+
+        # Parameters and import buttons, in the order of the definition
+        self.sidePanel = ttk.Frame(self)
+        self.sidePanel.grid(row=0, column=3, rowspan=5, padx=10, pady=10, sticky='n')
+
+        self.parameterEntries: dict[str, ttk.Entry] = {}
+        for row, (name, value) in enumerate(definition.get('parameters', {}).items()):
+            ttk.Label(self.sidePanel, text='{}:'.format(name)).grid(row=row, column=0, padx=5, pady=5, sticky='w')
+            entry = ttk.Entry(self.sidePanel, width=10)
+            entry.grid(row=row, column=1, padx=5, pady=5)
+            entry.insert(0, str(value))
+            self.parameterEntries[name] = entry
+
+        self.inputButtons: dict[str, ttk.Button] = {}
+        for row, name in enumerate(self.inputNames, start=len(self.parameterEntries)):
+            spec = definition['inputs'][name]
+            button = ttk.Button(self.sidePanel, text='Import {}'.format(spec.get('title', name)), command=lambda name=name: self.inputButtonPressed(name))
+            button.grid(row=row, column=0, columnspan=2, padx=5, pady=5, sticky='ew')
+            button.config(state='disabled')
+            self.inputButtons[name] = button
+
+        self.generateButton = ttk.Button(self, text='Generate Canvas CSV', command=self.generateButtonPressed)
+        self.generateButton.grid(row=5, column=1, padx=10, pady=10)
+        self.generateButton.config(state='disabled')
+
+    """
+    Name of the attribute holding the DataFrame of an input
+    """
+    def inputAttribute(self, name) -> str:
+        return 'input_' + re.sub(r'\W', '_', name)
+
+    """
+    Imported inputs by name, None until every input has been imported
+    """
+    @property
+    def inputs(self) -> dict[str, pd.DataFrame]:
+        inputs = {name: getattr(self, self.inputAttribute(name)) for name in self.inputNames}
+        return inputs if all(sheet is not None for sheet in inputs.values()) else None
+
+    """
+    Values of the parameter entries, falling back to the defaults of the definition if an entry is not a number
+    """
+    @property
+    def parameters(self) -> dict[str, float]:
+        parameters = {}
+        for name, entry in self.parameterEntries.items():
+            try:
+                parameters[name] = float(entry.get())
+            except ValueError:
+                print('{} cannot be parsed. Using default value of {}.'.format(name, self.definition['parameters'][name]))
+                parameters[name] = self.definition['parameters'][name]
+        return parameters
+
+    """
+    Assignment selection event handler
+    """
+    def assignmentSelected(self, event):
+        def loaded():
+            for button in self.inputButtons.values():
+                button.config(state='normal')
+            self.updateTable()
+        self.loadAssignment(loaded)
+
+    """
+    Import event handler of an input.
+    The Excel files are read in the background, keeping only the columns of the formula and the display.
+    Once every input has been imported, the scores are calculated, and again whenever an input is imported again.
+    """
+    def inputButtonPressed(self, name):
+        spec = self.definition['inputs'][name]
+        paths = filedialog.askopenfilenames(filetypes=[('Excel files', '.xlsx .xls')], title='Select the {} .xlsx file(s):'.format(spec.get('title', name)))
+        if paths == '':
+            return
+
+        definition = self.definition
+        def task(progress):
+            from engine.assignment import compileType, readInput
+            formula = compileType(definition)
+            with stage('Parse {}'.format(name)) as s:
+                sheet = readInput(definition, name, paths, formula, self.duplicatePolicy, review=self.reviewDuplicates, progress=progress)
+                s.rows = sheet.shape[0]
+            return sheet
+
+        def done(sheet):
+            setattr(self, self.inputAttribute(name), sheet)
+            if self.inputs is None:
+                self.saveSession()
+                return
+            self.scoreAssignment()
+
+        self.runTask('Parse {}'.format(name), task, done)
+
+    """
+    Calculate the scores with the formula of the type, in the background.
+    Scores are then imported into the self.grades DataFrame, with absent students receiving 0.
+    """
+    def scoreAssignment(self):
+        definition, inputs, assignmentLabel, parameters = self.definition, self.inputs, self.assignmentLabel, self.parameters
+        def task(progress):
+            from engine.assignment import compileType, scoreAssignment, displayedColumns, displayedHeaders
+            formula = compileType(definition)
+            with stage('Calculate scores') as s:
+                report = scoreAssignment(definition, formula, inputs, assignmentLabel, parameters)
+                s.rows = report.shape[0]
+            return report, displayedHeaders(displayedColumns(definition, formula))
+
+        def done(result):
+            self.report, self.extraColumns = result
+
+            # Fill scores into grades DataFrame
+            self.mergeScores()
+            self.updateTable()
+
+            # Enable output button
+            self.generateButton.config(state='normal')
+
+        self.runTask('Calculate scores', task, done)
+
+    """
+    Show the displayed columns of a restored session
+    """
+    def restoreSession(self, state: dict, frames: dict):
+        super().restoreSession(state, frames)
+        if self.report is not None:
+            self.extraColumns = [column for column in self.report.columns if column not in ['SIS Login ID', self.assignmentLabel]]
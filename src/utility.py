@@ -1,102 +1,202 @@
+from __future__ import annotations
+
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 
-import pandas as pd
 from math import isnan
+from numbers import Real, Integral
+from typing import TYPE_CHECKING
+
+# numpy and pandas are imported on first use, so the apps start without them
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
-class ScrollbarFrame(tk.Frame):
+class Table(tk.Frame):
     """
-    Extends class tk.Frame to support a scrollable Frame 
-    This class is independent from the widgets to be scrolled and 
-    can be used to replace a standard tk.Frame
+    Displays a DataFrame on the GUI.
+    Supports scrolling horizontally and vertically.
+
+    The table is virtualized: a ttk.Treeview holds only as many items as there are visible rows,
+    and scrolling refills these items from the DataFrame, so the cost of a redraw does not
+    depend on the number of rows.
     """
-    def __init__(self, parent, **kwargs):
-        tk.Frame.__init__(self, parent, **kwargs)
+    def __init__(self, parent, width=600, height=300, columnWidth=120):
+        tk.Frame.__init__(self, parent, width=width, height=height)
+        self.grid_propagate(False)
+        self.pack_propagate(False)
 
-        # The Scrollbar, layout to the right
-        vsb = tk.Scrollbar(self, orient="vertical")
-        vsb.pack(side="right", fill="y")
+        self._df: pd.DataFrame = None
+        self._first = 0
+        self._items: list[str] = []
+        self.columnWidth = columnWidth
 
-        # The Scrollbar, layout to the right
-        hsb = tk.Scrollbar(self, orient="horizontal")
-        hsb.pack(side="bottom", fill="x")
+        # The Scrollbars, layout to the right and bottom
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.vsb.pack(side="right", fill="y")
+        self.hsb = ttk.Scrollbar(self, orient="horizontal")
+        self.hsb.pack(side="bottom", fill="x")
 
-        # The Canvas which supports the Scrollbar Interface, layout to the left
-        self.canvas = tk.Canvas(self, borderwidth=0, width=600, height=300)
-        self.canvas.pack(side="left", fill="both", expand=True)
+        # The Treeview, only the horizontal scrolling is handled by Tk
+        self.tree = ttk.Treeview(self, show='headings', selectmode='browse', height=1)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.configure(xscrollcommand=self.hsb.set)
+        self.hsb.configure(command=self.tree.xview)
 
-        # Bind the Scrollbar to the self.canvas Scrollbar Interface
-        self.canvas.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        vsb.configure(command=self.canvas.yview)
-        hsb.configure(command=self.canvas.xview)
+        # Vertical scrolling by mouse wheel (Windows/macOS and X11)
+        self.tree.bind("<MouseWheel>", lambda event: self.yview('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind("<Button-4>", lambda event: self.yview('scroll', -1, 'units'))
+        self.tree.bind("<Button-5>", lambda event: self.yview('scroll', 1, 'units'))
 
-        # The Frame to be scrolled, layout into the canvas
-        # All widgets to be scrolled have to use this Frame as parent
-        self.scrolled_frame = tk.Frame(self.canvas, background='black')
-        self.canvas.create_window((4, 4), window=self.scrolled_frame, anchor="nw")
+        # Number of visible rows follows the size of the table
+        self.tree.bind("<Configure>", self.on_configure)
 
-        # Configures the scrollregion of the Canvas dynamically
-        self.scrolled_frame.bind("<Configure>", self.on_configure)
+    @property
+    def rows(self) -> int:
+        return 0 if self._df is None else self._df.shape[0]
+
+    @property
+    def columns(self) -> int:
+        return 0 if self._df is None else self._df.shape[1]
+
+    @property
+    def columnNames(self) -> list:
+        return [] if self._df is None else list(self._df.columns)
 
     def on_configure(self, event):
-        """Set the scroll region to encompass the scrolled frame"""
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        """Resize the item pool to the number of rows that fit in the Treeview"""
+        rowheight = ttk.Style().lookup('Treeview', 'rowheight') or 20
+        visible = max(1, (event.height - int(rowheight)) // int(rowheight))
+        if visible != len(self._items):
+            self.tree.delete(*self._items)
+            self._items = [self.tree.insert('', 'end') for _ in range(visible)]
+            self.render()
+
+    def yview(self, *args):
+        """Scroll the rows, using the same arguments as Tk scrollbar commands"""
+        visible = len(self._items)
+        if args[0] == 'moveto':
+            first = int(float(args[1]) * self.rows)
+        elif args[0] == 'scroll':
+            step = visible if args[2] == 'pages' else 1
+            first = self._first + int(args[1]) * step
+        else:
+            return
+        first = max(0, min(first, self.rows - visible))
+        if first != self._first:
+            self._first = first
+            self.render()
 
+    def get(self, row, column):
+        return formatCell(self._df.iat[row, column])
+
+    def setDataframe(self, df: pd.DataFrame):
+        """Display the DataFrame, keeping the scroll position if possible"""
+        columnNames = [str(column) for column in df.columns]
+        if self._df is None or columnNames != [str(column) for column in self._df.columns]:
+            self.tree.configure(columns=list(range(len(columnNames))))
+            for i, columnName in enumerate(columnNames):
+                self.tree.heading(i, text=columnName)
+                self.tree.column(i, width=self.columnWidth, minwidth=40, stretch=False)
+        self._df = df.reset_index(drop=True)
+        self._first = max(0, min(self._first, self.rows - len(self._items)))
+        self.render()
+
+    def updateColumns(self, columns: dict):
+        """
+        Replace the values of some columns, given as {column name: values} with one value per row.
+        Only the visible cells whose value changed are redrawn.
+        Falls back to a full redraw if the number of rows differs.
+        """
+        if any(len(values) != self.rows for values in columns.values()):
+            df = self._df.copy()
+            for name, values in columns.items():
+                df[name] = list(values)
+            self.setDataframe(df)
+            return
+
+        import numpy as np
+
+        visible = len(self._items)
+        for name, values in columns.items():
+            column = self._df.columns.get_loc(name)
+            new = np.asarray(values, dtype=object)
+            changed = changedRows(self._df[name].to_numpy(dtype=object), new)
+            self._df[name] = new
+            for row in changed[(changed >= self._first) & (changed < self._first + visible)]:
+                self.tree.set(self._items[row - self._first], column, formatCell(new[row]))
+
+    def render(self):
+        """Fill the visible items from the DataFrame"""
+        visible = len(self._items)
+        if self._df is None:
+            return
+        window = self._df.iloc[self._first:self._first + visible]
+        for i, iid in enumerate(self._items):
+            if i < window.shape[0]:
+                self.tree.item(iid, values=[formatCell(value) for value in window.iloc[i]])
+            else:
+                self.tree.item(iid, values=())
+        if self.rows > 0:
+            self.vsb.set(self._first / self.rows, min(1.0, (self._first + visible) / self.rows))
+        else:
+            self.vsb.set(0.0, 1.0)
 
-class Table(ScrollbarFrame):
+
+"""
+Positions where two object arrays differ, treating all missing values as equal
+"""
+def changedRows(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    import numpy as np
+    import pandas as pd
+
+    old = np.where(pd.isna(old), None, old)
+    new = np.where(pd.isna(new), None, new)
+    return np.flatnonzero(old != new)
+
+
+"""
+Text shown in a table cell, floats are shown with 2 decimal places
+"""
+def formatCell(value):
+    if isinstance(value, Real) and not isinstance(value, Integral) and not isnan(value):
+        return '{:.2f}'.format(value)
+    return value
+
+
+class TracePanel(tk.Toplevel):
     """
-    Displays a table on the GUI.
-    Supports scrolling horizontally and vertically.
+    Window listing the recorded stages: number of calls, total time, rows and peak memory.
+    summary() returns the rows to show, and save(path) writes the trace file.
     """
-    def __init__(self, parent, rows=0, columns=0):
-        ScrollbarFrame.__init__(self, parent)
-        self._widgets: list[list[tk.Label]] = []
-        self.rows = rows
-        self.columns = columns
-        self.initTable(rows, columns)
+    def __init__(self, parent, summary, save):
+        tk.Toplevel.__init__(self, parent)
+        self.title('Timings')
+        self.summary = summary
+        self.save = save
 
-    def get(self, row, column):
-        widget = self._widgets[row][column]
-        return widget.cget('text')
+        columns = ['Stage', 'Calls', 'Time (ms)', 'Rows', 'Peak MB']
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=12)
+        self.tree.pack(side="top", fill="both", expand=True)
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=200 if column == 'Stage' else 80, anchor='w' if column == 'Stage' else 'e')
 
-    def set(self, row, column, value):
-        widget = self._widgets[row][column]
-        if (isinstance(value, float) and not isnan(value)):
-            widget.config(text='{:.2f}'.format(value))
-        else:
-            widget.config(text=value)
+        buttons = tk.Frame(self)
+        buttons.pack(side="bottom", fill="x")
+        ttk.Button(buttons, text='Refresh', command=self.refresh).pack(side="left", padx=5, pady=5)
+        ttk.Button(buttons, text='Save trace', command=self.saveButtonPressed).pack(side="right", padx=5, pady=5)
 
-    def setColumn(self, column, values):
-        row = 1
-        for value in values:
-            self.set(row, column, value)
-            row += 1
-    
-    def setDataframe(self, df: pd.DataFrame, startIndex):
-        columnNames = df.columns.tolist()
-        for i in range(df.shape[1]):
-            self.set(0, i, columnNames[i])
-            self.setColumn(i, df[columnNames[i]][startIndex:-1])
-    
-    def initTable(self, rows, columns):
-        for row in range(self.rows):
-            for column in range(self.columns):
-                widget = self._widgets[row][column]
-                widget.destroy()
-        self._widgets = []
-        self.rows = rows
-        self.columns = columns
-        for row in range(rows):
-            current_row = []
-            for column in range(columns):
-                label = tk.Label(self.scrolled_frame, text="%s/%s" % (row, column), 
-                                 borderwidth=1)
-                label.grid(row=row, column=column, sticky='nsew', padx=1, pady=1)
-                current_row.append(label)
-            self._widgets.append(current_row)
-
-        for column in range(columns):
-            self.grid_columnconfigure(column, weight=1)
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for name, calls, seconds, rows, peak in self.summary():
+            self.tree.insert('', 'end', values=[name, calls, '{:.1f}'.format(seconds * 1000), '' if rows is None else rows, '{:.1f}'.format(peak)])
+
+    def saveButtonPressed(self):
+        trace_json = filedialog.asksaveasfilename(parent=self, defaultextension='.json', filetypes=[('Chrome trace', '.json')],
+                                                  title='Save the trace for chrome://tracing:')
+        if trace_json:
+            self.save(trace_json)
 
 
 class ComboboxDialog(simpledialog.Dialog):
@@ -105,10 +205,12 @@ class ComboboxDialog(simpledialog.Dialog):
     """
     def __init__(self, title, prompt,
                  values,
+                 initialvalue = None,
                  parent = None):
 
         self.prompt   = prompt
         self.values   = values
+        self.initialvalue = initialvalue
         simpledialog.Dialog.__init__(self, parent, title)
 
     def destroy(self):
@@ -123,6 +225,9 @@ class ComboboxDialog(simpledialog.Dialog):
         self.entry = ttk.Combobox(master, name="entry", values=self.values)
         self.entry.grid(row=1, padx=5, sticky='we')
 
+        if self.initialvalue is not None:
+            self.entry.set(self.initialvalue)
+
         return self.entry
 
     def validate(self):
@@ -147,4 +252,80 @@ Helper function to create a Combobox and return the result
 """
 def askcombobox(title, prompt, values, **kw):
     d = ComboboxDialog(title, prompt, values, **kw)
-    return d.result
\ No newline at end of file
+    return d.result
+
+class DuplicateDialog(simpledialog.Dialog):
+    """
+    Extends Dialog class to review all duplicated rows in a single Dialog.
+    The rows chosen by a policy are marked, and clicking a row keeps it instead of the other rows with the same key.
+    """
+    def __init__(self, title, prompt,
+                 conflicts, kept, choose, policies, policy,
+                 key = 'ITSC', columns = None,
+                 parent = None):
+
+        self.prompt    = prompt
+        self.conflicts = conflicts
+        self.kept      = set(kept)
+        self.choose    = choose
+        self.policies  = policies
+        self.policy    = policy
+        self.key       = key
+        self.columns   = [column for column in (columns or conflicts.columns) if column in conflicts.columns]
+        simpledialog.Dialog.__init__(self, parent, title)
+
+    def destroy(self):
+        self.tree = None
+        simpledialog.Dialog.destroy(self)
+
+    def body(self, master):
+
+        w = ttk.Label(master, text=self.prompt, justify='left')
+        w.grid(row=0, column=0, columnspan=2, padx=5, sticky='w')
+
+        w = ttk.Label(master, text='Policy:')
+        w.grid(row=1, column=0, padx=5, pady=5, sticky='w')
+
+        self.policyCombobox = ttk.Combobox(master, values=self.policies, state='readonly')
+        self.policyCombobox.grid(row=1, column=1, padx=5, pady=5, sticky='w')
+        self.policyCombobox.set(self.policy)
+        self.policyCombobox.bind("<<ComboboxSelected>>", self.policySelected)
+
+        self.tree = ttk.Treeview(master, columns=['Keep'] + self.columns, show='headings', selectmode='none', height=15)
+        self.tree.grid(row=2, column=0, columnspan=2, padx=5, sticky='nsew')
+        for column in ['Keep'] + self.columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=40 if column == 'Keep' else 120, stretch=False)
+        for index, row in zip(self.conflicts.index, self.conflicts.loc[:, self.columns].itertuples(index=False)):
+            self.tree.insert('', 'end', iid=str(index), values=[''] + [formatCell(value) for value in row])
+        self.tree.bind("<ButtonRelease-1>", self.rowClicked)
+        self.refresh()
+
+        return self.policyCombobox
+
+    def refresh(self):
+        for index in self.conflicts.index:
+            self.tree.set(str(index), 'Keep', '*' if index in self.kept else '')
+
+    def policySelected(self, event):
+        self.kept = set(self.choose(self.policyCombobox.get()))
+        self.refresh()
+
+    def rowClicked(self, event):
+        iid = self.tree.identify_row(event.y)
+        if not iid:
+            return
+        index = self.conflicts.index[self.conflicts.index.astype(str) == iid][0]
+        same = self.conflicts.index[self.conflicts[self.key] == self.conflicts.at[index, self.key]]
+        self.kept = self.kept.difference(same) | {index}
+        self.refresh()
+
+    def apply(self):
+        self.result = (sorted(self.kept), self.policyCombobox.get())
+
+"""
+Helper function to review duplicated rows and return the indices to keep and the selected policy, or None if cancelled
+"""
+def askduplicates(title, prompt, conflicts, kept, choose, policies, policy, **kw):
+    d = DuplicateDialog(title, prompt, conflicts, kept, choose, policies, policy, **kw)
+    return d.result